@@ -0,0 +1,267 @@
+import io
+import numpy as np
+
+try:
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+
+
+"""ParsedAltoPage
+
+Columnar (struct-of-arrays) view of a parsed ALTO page. Coordinates are kept
+as (N,4) int32 arrays of (hpos, vpos, width, height) in document order, and
+the TextBlock -> TextLine -> String hierarchy is encoded by offset arrays:
+the lines of block b are lines[block_lines[b]:block_lines[b+1]] and the
+strings of line l are strings[line_strings[l]:line_strings[l+1]]. String
+contents are concatenated into a single buffer, the content of string s
+being content[content_offsets[s]:content_offsets[s+1]]. Optional polygon
+outlines of TextBlocks (PAGE <Coords points="x,y ...">, e.g., polygon zones
+written by run_segmentation.py) are stored the same way: the outline of
+block b is polygon_points[polygon_offsets[b]:polygon_offsets[b+1]], empty
+for blocks without one.
+
+Args:
+    width (int): Page WIDTH
+    height (int): Page HEIGHT
+    settings (str): processingStepSettings text ('' if absent)
+    blocks (np.ndarray): (B,4) int32 TextBlock rectangles
+    lines (np.ndarray): (L,4) int32 TextLine rectangles
+    strings (np.ndarray): (S,4) int32 String rectangles
+    block_lines (np.ndarray): (B+1,) int32 offsets into lines
+    line_strings (np.ndarray): (L+1,) int32 offsets into strings
+    content (str): Concatenated String contents
+    content_offsets (np.ndarray): (S+1,) int32 offsets into content
+    polygon_offsets (np.ndarray): (Optional) (B+1,) int32 offsets into polygon_points
+    polygon_points (np.ndarray): (Optional) (P,2) int32 TextBlock outline points
+"""
+class ParsedAltoPage(object):
+    def __init__(self, width, height, settings, blocks, lines, strings,
+                 block_lines, line_strings, content, content_offsets,
+                 polygon_offsets=None, polygon_points=None):
+        self.width           = width
+        self.height          = height
+        self.settings        = settings
+        self.blocks          = blocks
+        self.lines           = lines
+        self.strings         = strings
+        self.block_lines     = block_lines
+        self.line_strings    = line_strings
+        self.content         = content
+        self.content_offsets = content_offsets
+
+        if polygon_offsets is None:
+            polygon_offsets = np.zeros(len(blocks)+1, dtype=np.int32)
+            polygon_points  = np.zeros((0, 2), dtype=np.int32)
+        self.polygon_offsets = polygon_offsets
+        self.polygon_points  = polygon_points
+
+        self._line_texts   = None
+        self._block_texts  = None
+        self._string_texts = None
+
+    # Number of TextBlocks
+    def __len__(self):
+        return len(self.blocks)
+
+    def block_line_range(self, block_idx):
+        return range(self.block_lines[block_idx], self.block_lines[block_idx+1])
+
+    def line_string_range(self, line_idx):
+        return range(self.line_strings[line_idx], self.line_strings[line_idx+1])
+
+    def string_content(self, string_idx):
+        return self.content[self.content_offsets[string_idx]:self.content_offsets[string_idx+1]]
+
+    def has_polygons(self):
+        return len(self.polygon_points) > 0
+
+    # (K,2) outline of a TextBlock, or None if it only has a rectangle
+    def block_polygon(self, block_idx):
+        start, stop = self.polygon_offsets[block_idx], self.polygon_offsets[block_idx+1]
+        if start == stop:
+            return None
+        return self.polygon_points[start:stop]
+
+    """text_spans
+
+    Returns:
+        text (str): String contents in document order, each followed by a single space
+        line_offsets (np.ndarray): (L+1,) offsets of each TextLine's span in text
+    """
+    def text_spans(self):
+        offsets = self.content_offsets
+        text = ''.join([self.content[offsets[idx]:offsets[idx+1]] + ' ' for idx in range(len(offsets)-1)])
+
+        # String s starts at content_offsets[s] + s once a space follows every string
+        line_offsets = offsets[self.line_strings].astype(np.int64) + self.line_strings
+        return text, line_offsets
+
+    """line_texts / block_texts
+
+    Text of every TextLine / TextBlock (contents joined by single spaces, with a
+    trailing space), built once per page and cached.
+    """
+    def line_texts(self):
+        if self._line_texts is None:
+            self._build_texts()
+        return self._line_texts
+
+    def block_texts(self):
+        if self._block_texts is None:
+            self._build_texts()
+        return self._block_texts
+
+    # Content of every String followed by a single space
+    def string_texts(self):
+        if self._string_texts is None:
+            offsets = self.content_offsets.tolist()
+            self._string_texts = [self.content[start:stop] + ' ' for start, stop in zip(offsets[:-1], offsets[1:])]
+        return self._string_texts
+
+    def _build_texts(self):
+        text, line_offsets = self.text_spans()
+        block_offsets = line_offsets[self.block_lines]
+
+        self._line_texts  = [text[start:stop] for start, stop in zip(line_offsets[:-1].tolist(), line_offsets[1:].tolist())]
+        self._block_texts = [text[start:stop] for start, stop in zip(block_offsets[:-1].tolist(), block_offsets[1:].tolist())]
+
+
+
+"""iter_alto
+
+Single pass over an ALTO (or dhSegment zone) xml file. Elements are cleared
+and detached as soon as they are consumed, so memory stays flat regardless of
+the page size.
+
+Args:
+    source (str, bytes or file object): Path to the xml file, its content, or an open binary file
+
+Yields:
+    record (tuple): One of
+        ('Page', width, height)
+        ('processingStepSettings', text)
+        ('TextBlock', hpos, vpos, width, height)   -- emitted before its lines
+        ('TextLine', hpos, vpos, width, height)    -- emitted before its strings
+        ('String', content, hpos, vpos, width, height)
+        ('Coords', [(x, y), ...])                  -- outline of the enclosing TextBlock
+"""
+def iter_alto(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    stack = []
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        tag = elem.tag
+        if not isinstance(tag, str):
+            # Comments and processing instructions (lxml)
+            continue
+        tag = tag.rsplit('}', 1)[-1]
+
+        if event == 'start':
+            stack.append(elem)
+            if tag in ('TextBlock', 'TextLine'):
+                yield (tag,) + _rect(elem)
+            elif tag == 'Page':
+                yield ('Page', int(float(elem.get('WIDTH'))), int(float(elem.get('HEIGHT'))))
+            continue
+
+        stack.pop()
+        if tag == 'String':
+            yield ('String', elem.get('CONTENT', '')) + _rect(elem)
+        elif tag == 'Coords':
+            # Only TextBlock outlines are used (PAGE xml also has line/word Coords)
+            if stack and stack[-1].tag.rsplit('}', 1)[-1] == 'TextBlock' and elem.get('points'):
+                yield ('Coords', _points(elem.get('points')))
+            continue
+        elif tag == 'processingStepSettings':
+            yield ('processingStepSettings', elem.text or '')
+        elif tag not in ('TextBlock', 'TextLine', 'ComposedBlock', 'PrintSpace'):
+            continue
+
+        # Free the consumed subtree
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
+
+
+
+"""read_alto
+
+Args:
+    source (str, bytes or file object): Path to the ALTO xml file, its content, or an open binary file
+
+Returns:
+    page (ParsedAltoPage): Columnar page built in a single pass
+"""
+def read_alto(source):
+    width, height, settings = None, None, None
+    blocks, lines, strings = [], [], []
+    block_lines, line_strings = [], []
+    contents = []
+    polygons = {}
+    for record in iter_alto(source):
+        tag = record[0]
+        if tag == 'String':
+            if lines and blocks:
+                contents.append(record[1])
+                strings.append(record[2:])
+        elif tag == 'TextLine':
+            if blocks:
+                line_strings.append(len(strings))
+                lines.append(record[1:])
+        elif tag == 'TextBlock':
+            block_lines.append(len(lines))
+            blocks.append(record[1:])
+        elif tag == 'Page':
+            if width is None:
+                width, height = record[1], record[2]
+        elif tag == 'Coords':
+            if blocks:
+                polygons.setdefault(len(blocks)-1, record[1])
+        elif settings is None:
+            # First processingStepSettings, as the previous minidom reader
+            settings = record[1]
+
+    block_lines.append(len(lines))
+    line_strings.append(len(strings))
+
+    content_offsets = np.zeros(len(contents)+1, dtype=np.int32)
+    np.cumsum([len(text) for text in contents], out=content_offsets[1:])
+
+    polygon_offsets, polygon_points = None, None
+    if polygons:
+        polygon_offsets = np.zeros(len(blocks)+1, dtype=np.int32)
+        for block_idx, points in polygons.items():
+            polygon_offsets[block_idx+1] = len(points)
+        np.cumsum(polygon_offsets, out=polygon_offsets)
+        polygon_points = np.array([point for block_idx in sorted(polygons) for point in polygons[block_idx]],
+                                  dtype=np.int32).reshape(-1, 2)
+
+    if settings is None:
+        settings = ''
+
+    return ParsedAltoPage(width, height, settings,
+                          _rects(blocks), _rects(lines), _rects(strings),
+                          np.array(block_lines, dtype=np.int32),
+                          np.array(line_strings, dtype=np.int32),
+                          ''.join(contents), content_offsets,
+                          polygon_offsets, polygon_points)
+
+
+
+def _rects(records):
+    return np.array(records, dtype=np.int32).reshape(-1, 4)
+
+
+
+def _rect(elem):
+    return (int(float(elem.get('HPOS'))), int(float(elem.get('VPOS'))),
+            int(float(elem.get('WIDTH'))), int(float(elem.get('HEIGHT'))))
+
+
+
+def _points(points):
+    # 'x1,y1 x2,y2 ...'
+    return [tuple(int(float(value)) for value in point.split(',')) for point in points.split()]
@@ -0,0 +1,93 @@
+"""Startup-time benchmark for the mapping entry points.
+
+Imports each entry point in a fresh interpreter with `python -X importtime`,
+reports the cumulative import time of the module, and fails when
+  * a visualization-only dependency (matplotlib, cv2) is imported, or
+  * the median import time regresses beyond the tolerance of the stored baseline.
+
+Usage:
+    python benchmarks/import_time.py              # check against the baseline
+    python benchmarks/import_time.py --update     # store the current timings as the baseline
+"""
+import os, sys
+import re
+import json
+import argparse
+import subprocess
+
+REPO_DIR      = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_time_baseline.json')
+
+ENTRY_POINTS       = ['mapper', 'zone2OCR', 'utils']
+FORBIDDEN_MODULES  = ['matplotlib', 'cv2']
+
+
+
+"""measure
+
+Args:
+    module (str): Module to import in a fresh interpreter
+
+Returns:
+    cumulative_us (int): Cumulative import time of the module in microseconds
+    imported (set of str): Top-level packages imported along the way
+"""
+def measure(module):
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+                          cwd=REPO_DIR, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                          universal_newlines=True, check=True)
+
+    cumulative_us = None
+    imported = set()
+    for line in proc.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)', line)
+        if match is None:
+            continue
+        imported.add(match.group(4).split('.')[0])
+        if match.group(4) == module and len(match.group(3)) == 1:
+            cumulative_us = int(match.group(2))
+    return cumulative_us, imported
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Guard the import time of the mapping entry points')
+    parser.add_argument('-n', '--repeat', type=int, default=5,
+                        help='number of fresh interpreters per entry point (default=5)')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed relative slowdown against the baseline (default=0.5, i.e., +50%%)')
+    parser.add_argument('--update', action='store_true',
+                        help='store the current timings as the new baseline')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as baseline_fp:
+            baseline = json.load(baseline_fp)
+
+    results  = {}
+    failures = []
+    for module in ENTRY_POINTS:
+        timings = []
+        for _ in range(args.repeat):
+            cumulative_us, imported = measure(module)
+            timings.append(cumulative_us)
+        median_ms = sorted(timings)[len(timings)//2] / 1000.0
+        results[module] = round(median_ms, 1)
+
+        forbidden = sorted(imported.intersection(FORBIDDEN_MODULES))
+        status = 'ok'
+        if forbidden:
+            status = 'imports {}'.format(', '.join(forbidden))
+            failures.append(module)
+        elif module in baseline and median_ms > baseline[module] * (1 + args.tolerance):
+            status = 'regressed (baseline {:.1f} ms)'.format(baseline[module])
+            failures.append(module)
+        print("{:<10} {:>8.1f} ms  {}".format(module, median_ms, status))
+
+    if args.update:
+        with open(BASELINE_PATH, 'w') as baseline_fp:
+            json.dump(results, baseline_fp, indent=2, sort_keys=True)
+        print("Baseline stored at {}".format(BASELINE_PATH))
+    elif failures:
+        sys.exit("Import time check failed for: {}".format(', '.join(failures)))
@@ -0,0 +1,122 @@
+"""Throughput benchmark of the mapping pipeline on synthetic pages.
+
+Generates zone/OCR page pairs at several scales (see synthetic_pages.py),
+times process_zone, process_ocr, mapping (usecase 2) and save_json on each,
+reports the median per stage in milliseconds, and fails when a stage
+regresses beyond the tolerance of the stored baseline.
+
+Usage:
+    python benchmarks/mapping_time.py              # check against the baseline
+    python benchmarks/mapping_time.py --update     # store the current timings as the baseline
+"""
+import os, sys
+import io
+import json
+import time
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+
+REPO_DIR      = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mapping_time_baseline.json')
+sys.path.insert(0, REPO_DIR)
+
+from utils import process_zone, process_ocr, mapping, save_json
+from synthetic_pages import write_pages
+
+# name -> generate_page options; 'medium' matches the size of the example page
+SCALES = {
+    'small':  dict(num_blocks=20,  lines_per_block=8,  words_per_line=4, overlap=2.0),
+    'medium': dict(num_blocks=90,  lines_per_block=13, words_per_line=5, overlap=2.0),
+    'large':  dict(num_blocks=300, lines_per_block=15, words_per_line=8, overlap=3.0),
+    'dense':  dict(num_blocks=300, lines_per_block=15, words_per_line=8, overlap=12.0),
+}
+STAGES = ['process_zone', 'process_ocr', 'mapping', 'save_json']
+
+# Slowdowns below this many milliseconds are treated as timer noise
+NOISE_FLOOR_MS = 1.0
+
+
+
+"""measure
+
+Args:
+    zone_xml_file_path (str): Path to the zone xml file
+    ocr_xml_file_path (str): Path to the OCR xml file
+    save_path (str): Directory receiving the output JSON
+    iou_threshold (float): Threshold for intersection over union
+
+Returns:
+    timings (dict): Stage -> milliseconds
+"""
+def measure(zone_xml_file_path, ocr_xml_file_path, save_path, iou_threshold=0.1):
+    timings = {}
+
+    start = time.perf_counter()
+    zone_textBlocks = process_zone(zone_xml_file_path)
+    timings['process_zone'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ocr_textBlocks, factor = process_ocr(ocr_xml_file_path)
+    timings['process_ocr'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    map_json = mapping(zone_textBlocks=zone_textBlocks, ocr_textBlocks=ocr_textBlocks, factor=factor,
+                       usecase=2, iou_threshold=iou_threshold, progress=False)
+    timings['mapping'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        save_json(save_path, 'bench.json', map_json)
+    timings['save_json'] = time.perf_counter() - start
+
+    return {stage: seconds * 1000 for stage, seconds in timings.items()}
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Guard the mapping throughput on synthetic pages')
+    parser.add_argument('-n', '--repeat', type=int, default=5,
+                        help='number of timed runs per scale (default=5)')
+    parser.add_argument('--scales', type=str, nargs='+', default=sorted(SCALES), choices=sorted(SCALES),
+                        help='scales to run (default=all)')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed relative slowdown against the baseline (default=0.5, i.e., +50%%)')
+    parser.add_argument('--update', action='store_true',
+                        help='store the current timings as the new baseline')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as baseline_fp:
+            baseline = json.load(baseline_fp)
+
+    results  = dict(baseline) if args.update else {}
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp_path:
+        for scale in args.scales:
+            (zone_xml_file_path, ocr_xml_file_path), = write_pages(os.path.join(tmp_path, scale), **SCALES[scale])
+
+            # Warm-up run (imports, OS file cache)
+            measure(zone_xml_file_path, ocr_xml_file_path, tmp_path)
+            runs = [measure(zone_xml_file_path, ocr_xml_file_path, tmp_path) for _ in range(args.repeat)]
+
+            results[scale] = {}
+            for stage in STAGES:
+                timings   = sorted(run[stage] for run in runs)
+                median_ms = timings[len(timings)//2]
+                results[scale][stage] = round(median_ms, 2)
+
+                status = 'ok'
+                reference = baseline.get(scale, {}).get(stage)
+                if reference is not None and median_ms > max(reference * (1 + args.tolerance), reference + NOISE_FLOOR_MS):
+                    status = 'regressed (baseline {:.2f} ms)'.format(reference)
+                    failures.append('{}/{}'.format(scale, stage))
+                print("{:<8} {:<14} {:>10.2f} ms  {}".format(scale, stage, median_ms, status))
+
+    if args.update:
+        with open(BASELINE_PATH, 'w') as baseline_fp:
+            json.dump(results, baseline_fp, indent=2, sort_keys=True)
+        print("Baseline stored at {}".format(BASELINE_PATH))
+    elif failures:
+        sys.exit("Mapping time check failed for: {}".format(', '.join(failures)))
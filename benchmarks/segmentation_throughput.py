@@ -0,0 +1,129 @@
+"""Throughput sweep of the dhSegment model over session settings.
+
+Runs the segmentation model on a set of page images once per combination of
+intra-op threads, inter-op threads, graph optimization level, CPU pinning
+and number of concurrent processes, and reports the images per second of
+each. Every configuration runs in fresh processes since TensorFlow creates
+its thread pools once per process.
+
+Images are decoded as in run_segmentation.py (reduced JPEG scale) before the
+timed runs, so only the model is measured.
+
+Usage:
+    python benchmarks/segmentation_throughput.py -i <IMAGE_DIR> --intraop 0 4 16 --interop 0 1 2 [--processes 1 4]
+"""
+import os, sys
+import json
+import time
+import argparse
+import itertools
+import subprocess
+
+REPO_DIR  = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.path.join(REPO_DIR, 'dhSegment', 'pretrained_models', 'ENP_500_model_v3', 'export', '1564890842')
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'dhSegment'))
+
+SETTINGS = ['intraop', 'interop', 'optimizer', 'cpus', 'processes']
+
+
+
+"""run_config
+
+Loads the model with one configuration and times it (runs in a child process).
+
+Args:
+    config (dict): Settings (see SETTINGS) plus model_dir, image_paths, input_size, repeat and gpu
+
+Returns:
+    result (dict): Number of images and wall-clock start/end of the timed runs
+"""
+def run_config(config):
+    os.environ['CUDA_VISIBLE_DEVICES'] = config['gpu']
+    from dh_segment.inference import LoadedModel
+    from image_header import read_reduced
+
+    images = [read_reduced(image_path, config['input_size'])[0] for image_path in config['image_paths']]
+    model  = LoadedModel(config['model_dir'], predict_mode='image',
+                         intra_op_threads=config['intraop'], inter_op_threads=config['interop'],
+                         optimizer_level=config['optimizer'], cpus=config['cpus'])
+
+    # Warm-up run (graph initialization, memory allocation)
+    model.predict(images[0])
+
+    start = time.time()
+    for _ in range(config['repeat']):
+        for image in images:
+            model.predict(image)
+    end = time.time()
+    model.close()
+    return {'images': config['repeat'] * len(images), 'start': start, 'end': end}
+
+
+
+"""measure
+
+Args:
+    config (dict): Configuration (see run_config)
+
+Returns:
+    images_per_second (float): Throughput of all processes together
+"""
+def measure(config):
+    command  = [sys.executable, os.path.abspath(__file__), '--child', json.dumps(config)]
+    children = [subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True)
+                for _ in range(config['processes'])]
+
+    results = []
+    for child in children:
+        stdout, _ = child.communicate()
+        if child.returncode != 0:
+            raise RuntimeError("Benchmark process failed with exit code {}".format(child.returncode))
+        results.append(json.loads(stdout.strip().splitlines()[-1]))
+
+    elapsed = max(r['end'] for r in results) - min(r['start'] for r in results)
+    return sum(r['images'] for r in results) / elapsed
+
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        print(json.dumps(run_config(json.loads(sys.argv[2]))))
+        sys.exit()
+
+    parser = argparse.ArgumentParser(description='Sweep the session settings of the segmentation model')
+    parser.add_argument('-i', '--imagepath', type=str, required=True,
+                        help='a directory of page images (*.jpg)')
+    parser.add_argument('-m', '--modeldir', type=str, default=MODEL_DIR,
+                        help='exported model directory (default=ENP_500_model_v3)')
+    parser.add_argument('-n', '--images', type=int, default=10,
+                        help='number of images per timed run (default=10)')
+    parser.add_argument('--repeat', type=int, default=2,
+                        help='number of timed runs over the images (default=2)')
+    parser.add_argument('--inputsize', type=int, default=720000,
+                        help='number of pixels the model resizes its input to (default=720000)')
+    parser.add_argument('--gpu', type=str, default='',
+                        help='GPU(s) visible to the model, as CUDA_VISIBLE_DEVICES (default=CPU only)')
+    parser.add_argument('--intraop', type=int, nargs='+', default=[0],
+                        help='intra-op thread counts to sweep (default=0, one per available CPU)')
+    parser.add_argument('--interop', type=int, nargs='+', default=[0],
+                        help='inter-op thread counts to sweep (default=0, one per available CPU)')
+    parser.add_argument('--optimizer', type=str, nargs='+', default=['L1'], choices=['L0', 'L1'],
+                        help='graph optimization levels to sweep (default=L1)')
+    parser.add_argument('--cpus', type=str, nargs='+', default=[None],
+                        help='CPU lists to pin each process to, e.g. 0-15 (default=no pinning)')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1],
+                        help='numbers of concurrent processes to sweep (default=1)')
+    args = parser.parse_args()
+
+    image_paths = sorted(os.path.join(args.imagepath, f) for f in os.listdir(args.imagepath)
+                         if f.lower().endswith('.jpg'))[:args.images]
+    if not image_paths:
+        sys.exit("No *.jpg image found under {}".format(args.imagepath))
+
+    print("{:>8} {:>8} {:>9} {:>10} {:>9} {:>10}".format(*SETTINGS, 'images/s'))
+    for values in itertools.product(args.intraop, args.interop, args.optimizer, args.cpus, args.processes):
+        config = dict(zip(SETTINGS, values), model_dir=args.modeldir, image_paths=image_paths,
+                      input_size=args.inputsize, repeat=args.repeat, gpu=args.gpu)
+        images_per_second = measure(config)
+        print("{:>8} {:>8} {:>9} {:>10} {:>9} {:>10.2f}".format(*[str(v) for v in values], images_per_second))
@@ -0,0 +1,186 @@
+"""Synthetic ALTO / zone page generator.
+
+Builds OCR pages that mirror the structure of example/ocr_xmls/sn86058242-19200121.xml
+(ALTO v2 in inch1200 units: Description with processingStepSettings, Styles,
+Layout/Page/PrintSpace/TextBlock/TextLine/String with SP in between) and the
+matching dhSegment zone page (PAGE xml with one TextBlock per zone, in pixels).
+
+OCR textblocks are laid out in columns. Zones are the pixel bounding boxes of
+runs of consecutive textblocks of a column, so `overlap` controls how many OCR
+textblocks each zone covers on average.
+
+Usage:
+    python benchmarks/synthetic_pages.py -o <DIR> [--pages 10] [--blocks 90] [--lines 13] [--words 5] [--overlap 2]
+"""
+import os
+import random
+import argparse
+from xml.sax.saxutils import quoteattr
+
+# Page geometry of the example newspaper page
+IMAGE_WIDTH  = 5887
+IMAGE_HEIGHT = 7922
+DPI          = 300
+UNITS        = 1200 // DPI   # inch1200 units per pixel
+
+WORDS = ['the', 'of', 'and', 'to', 'a', 'in', 'for', 'is', 'on', 'that', 'by', 'this',
+         'with', 'county', 'city', 'council', 'street', 'school', 'news', 'mrs.', 'Mr.',
+         'Indiana', 'January', '1920,', 'meeting', 'farmers', 'week', 'said', '"will', 'be']
+
+
+
+"""generate_page
+
+Args:
+    num_blocks (int): Number of OCR TextBlocks
+    lines_per_block (int): Number of TextLines per TextBlock
+    words_per_line (int): Number of Strings per TextLine
+    overlap (float): Average number of OCR TextBlocks covered by a zone
+    seed (int): Random seed
+
+Returns:
+    zone_xml (bytes): dhSegment zone page
+    ocr_xml (bytes): ALTO OCR page
+"""
+def generate_page(num_blocks=90, lines_per_block=13, words_per_line=5, overlap=2.0, seed=0):
+    rng = random.Random(seed)
+
+    num_columns  = max(1, min(7, num_blocks // 8 or 1))
+    column_width = (IMAGE_WIDTH - 2*100) // num_columns
+    blocks_per_column = -(-num_blocks // num_columns)
+    block_height = (IMAGE_HEIGHT - 2*100) // blocks_per_column
+
+    # TextBlock rectangles in pixels, column by column
+    block_rects = []
+    for block_idx in range(num_blocks):
+        column, row = divmod(block_idx, blocks_per_column)
+        hpos = 100 + column*column_width + rng.randint(0, 10)
+        vpos = 100 + row*block_height + rng.randint(0, 10)
+        block_rects.append((column, hpos, vpos, column_width - 20, block_height - 20))
+
+    ocr_xml = _ocr_page(block_rects, lines_per_block, words_per_line, rng)
+    zone_xml = _zone_page(block_rects, overlap, rng)
+    return zone_xml, ocr_xml
+
+
+
+def _ocr_page(block_rects, lines_per_block, words_per_line, rng):
+    settings = ("abbyy9.version:9.0.0.7394Lang:engWord Count:{}width:{}height:{}xdpi:{}ydpi:{}"
+                .format(len(block_rects)*lines_per_block*words_per_line, IMAGE_WIDTH, IMAGE_HEIGHT, DPI, DPI))
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>'
+             '<alto xmlns="http://www.loc.gov/standards/alto/ns-v2#"><Description>'
+             '<MeasurementUnit>inch1200</MeasurementUnit>'
+             '<sourceImageInformation><fileName>synthetic.tif</fileName></sourceImageInformation>'
+             '<OCRProcessing ID="OCR.0"><ocrProcessingStep><processingStepSettings>{}</processingStepSettings>'
+             '</ocrProcessingStep></OCRProcessing></Description>'
+             '<Styles><TextStyle ID="TS_10.0" FONTSIZE="10.0"/></Styles>'
+             '<Layout><Page ID="PAGE.0" HEIGHT="{}" WIDTH="{}" PHYSICAL_IMG_NR="1" PROCESSING="OCR.0">'
+             '<PrintSpace ID="PS.0" HEIGHT="{}.0" WIDTH="{}.0" HPOS="0.0" VPOS="0.0">'
+             .format(settings, IMAGE_HEIGHT*UNITS, IMAGE_WIDTH*UNITS, IMAGE_HEIGHT*UNITS, IMAGE_WIDTH*UNITS)]
+
+    for block_idx, (_, hpos, vpos, width, height) in enumerate(block_rects, 1):
+        hpos, vpos, width, height = hpos*UNITS, vpos*UNITS, width*UNITS, height*UNITS
+        block_id = "TB.0001.{}".format(block_idx)
+        parts.append('<TextBlock ID="{}" HEIGHT="{}" WIDTH="{}" HPOS="{}" VPOS="{}" language="eng">'
+                     .format(block_id, height, width, hpos, vpos))
+
+        line_height = height // lines_per_block
+        word_width  = width // words_per_line
+        for line_idx in range(lines_per_block):
+            line_vpos = vpos + line_idx*line_height
+            line_id = "{}_{}".format(block_id, line_idx)
+            parts.append('<TextLine ID="{}" HEIGHT="{}.0" WIDTH="{}.0" HPOS="{}.0" VPOS="{}.0">'
+                         .format(line_id, line_height, width, hpos, line_vpos))
+            for word_idx in range(words_per_line):
+                word_hpos = hpos + word_idx*word_width
+                if word_idx > 0:
+                    parts.append('<SP WIDTH="{}.0" HPOS="{}.0" VPOS="{}.0"/>'.format(word_width//4, word_hpos - word_width//4, line_vpos))
+                parts.append('<String ID="{}_{}" STYLEREFS="TS_10.0" HEIGHT="{}.0" WIDTH="{}.0" HPOS="{}.0" VPOS="{}.0" CONTENT={} WC="0.734"/>'
+                             .format(line_id, word_idx, line_height*3//4, word_width*3//4, word_hpos, line_vpos,
+                                     quoteattr(rng.choice(WORDS))))
+            parts.append('</TextLine>')
+        parts.append('</TextBlock>')
+
+    parts.append('</PrintSpace></Page></Layout></alto>')
+    return ''.join(parts).encode('utf-8')
+
+
+
+def _zone_page(block_rects, overlap, rng):
+    parts = ['<PcGts xmlns="http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15">'
+             '<Metadata /><Page HEIGHT="{}" WIDTH="{}">'.format(IMAGE_HEIGHT, IMAGE_WIDTH)]
+
+    # Runs of consecutive blocks of a column, of random length around overlap
+    zone_idx = 0
+    block_idx = 0
+    while block_idx < len(block_rects):
+        run_length = max(1, int(round(rng.uniform(0.5, 1.5) * overlap)))
+        run = [rect for rect in block_rects[block_idx:block_idx+run_length] if rect[0] == block_rects[block_idx][0]]
+        block_idx += len(run)
+
+        x0 = min(rect[1] for rect in run) + rng.randint(-15, 15)
+        y0 = min(rect[2] for rect in run) + rng.randint(-15, 15)
+        x1 = max(rect[1] + rect[3] for rect in run) + rng.randint(-15, 15)
+        y1 = max(rect[2] + rect[4] for rect in run) + rng.randint(-15, 15)
+        zone_idx += 1
+        parts.append('<TextBlock HEIGHT="{}" HPOS="{}" ID="{}" VPOS="{}" WIDTH="{}" />'
+                     .format(y1 - y0, max(0, x0), zone_idx, max(0, y0), x1 - x0))
+
+    parts.append('</Page></PcGts>')
+    return ''.join(parts).encode('utf-8')
+
+
+
+"""write_pages
+
+Args:
+    out_path (str): Directory receiving zone_xmls/ and ocr_xmls/
+    num_pages (int): Number of page pairs
+    **kwargs: generate_page options (seed is incremented per page)
+
+Returns:
+    pairs (list of (str, str)): (zone_xml_file_path, ocr_xml_file_path)
+"""
+def write_pages(out_path, num_pages=1, seed=0, **kwargs):
+    zone_dir = os.path.join(out_path, 'zone_xmls')
+    ocr_dir  = os.path.join(out_path, 'ocr_xmls')
+    os.makedirs(zone_dir, exist_ok=True)
+    os.makedirs(ocr_dir, exist_ok=True)
+
+    pairs = []
+    for page_idx in range(num_pages):
+        zone_xml, ocr_xml = generate_page(seed=seed+page_idx, **kwargs)
+        page_name = "synthetic-{:05d}".format(page_idx)
+        zone_xml_file_path = os.path.join(zone_dir, page_name + '_dhSegment.xml')
+        ocr_xml_file_path  = os.path.join(ocr_dir, page_name + '.xml')
+        with open(zone_xml_file_path, 'wb') as zone_fp:
+            zone_fp.write(zone_xml)
+        with open(ocr_xml_file_path, 'wb') as ocr_fp:
+            ocr_fp.write(ocr_xml)
+        pairs.append((zone_xml_file_path, ocr_xml_file_path))
+    return pairs
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic zone/OCR xml page pairs')
+    parser.add_argument('-o', '--outpath', type=str, required=True,
+                        help='a directory receiving zone_xmls/ and ocr_xmls/')
+    parser.add_argument('--pages', type=int, default=10,
+                        help='number of page pairs (default=10)')
+    parser.add_argument('--blocks', type=int, default=90,
+                        help='number of OCR TextBlocks per page (default=90)')
+    parser.add_argument('--lines', type=int, default=13,
+                        help='number of TextLines per TextBlock (default=13)')
+    parser.add_argument('--words', type=int, default=5,
+                        help='number of Strings per TextLine (default=5)')
+    parser.add_argument('--overlap', type=float, default=2.0,
+                        help='average number of OCR TextBlocks covered by a zone (default=2)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed (default=0)')
+    args = parser.parse_args()
+
+    write_pages(args.outpath, num_pages=args.pages, seed=args.seed,
+                num_blocks=args.blocks, lines_per_block=args.lines,
+                words_per_line=args.words, overlap=args.overlap)
+    print("{} page pair(s) written to {}".format(args.pages, args.outpath))
@@ -0,0 +1,330 @@
+import numpy as np
+
+from spatial_index import BlockIndex
+
+
+
+"""to_boxes
+
+Args:
+    rects (list of (hpos, vpos, width, height)): Axis-aligned rectangles
+
+Returns:
+    boxes (np.ndarray): (N,4) int32 array of (x0, y0, x1, y1)
+"""
+def to_boxes(rects):
+    rects = np.asarray(rects, dtype=np.int32).reshape(-1, 4)
+    boxes = rects.copy()
+    boxes[:, 2] += rects[:, 0]
+    boxes[:, 3] += rects[:, 1]
+    return boxes
+
+
+
+"""scale_rects
+
+Args:
+    rects (np.ndarray): (N,4) array of (hpos, vpos, width, height)
+    factor (float): Scale applied to each attribute (truncated like int(value*factor))
+
+Returns:
+    rects (np.ndarray): (N,4) int32 array
+"""
+def scale_rects(rects, factor):
+    rects = np.asarray(rects).reshape(-1, 4)
+    return (rects * factor).astype(np.int32)
+
+
+
+"""box_coords
+
+Args:
+    box ((x0, y0, x1, y1)): Axis-aligned box
+
+Returns:
+    coords (list): Corners in the order used by the output JSON,
+                   i.e., [bottom-left, bottom-right, top-right, top-left]
+"""
+def box_coords(box):
+    x0, y0, x1, y1 = [int(v) for v in box]
+    return [[x0, y1], [x1, y1], [x1, y0], [x0, y0]]
+
+
+
+"""is_box
+
+Args:
+    coords (list of (x, y)): Polygon exterior
+
+Returns:
+    (bool): True if coords describe an axis-aligned rectangle
+"""
+def is_box(coords):
+    coords = np.asarray(coords)
+    if(len(coords) == 5 and np.array_equal(coords[0], coords[-1])):
+        coords = coords[:-1]
+    if(len(coords) != 4):
+        return False
+    xs = np.unique(coords[:, 0])
+    ys = np.unique(coords[:, 1])
+    if(len(xs) != 2 or len(ys) != 2):
+        return False
+    # Every corner of the bounding box must be used exactly once
+    corners = set(map(tuple, coords.tolist()))
+    return corners == {(x, y) for x in xs.tolist() for y in ys.tolist()}
+
+
+
+"""box_area
+
+Args:
+    boxes (np.ndarray): (N,4) array of (x0, y0, x1, y1)
+
+Returns:
+    areas (np.ndarray): (N,) int64 array
+"""
+def box_area(boxes):
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+
+
+"""intersection_area
+
+Args:
+    boxes_a (np.ndarray): (N,4) array of (x0, y0, x1, y1)
+    boxes_b (np.ndarray): (M,4) array of (x0, y0, x1, y1)
+
+Returns:
+    inter (np.ndarray): (N,M) int64 array of pairwise intersection areas
+"""
+def intersection_area(boxes_a, boxes_b):
+    a = np.asarray(boxes_a, dtype=np.int64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.int64).reshape(-1, 4)
+
+    inter_w = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    inter_h = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    return np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+
+
+
+"""iou_matrix
+
+Pairwise intersection over union of two sets of axis-aligned boxes. Matches
+shapely's Polygon.intersection(...).area / Polygon.union(...).area for
+integer boxes. Rows of boxes_a with a true polygon outline fall back to
+shapely, restricted to the candidates whose boxes overlap.
+
+Args:
+    boxes_a (np.ndarray): (N,4) array of (x0, y0, x1, y1), e.g., zones
+    boxes_b (np.ndarray): (M,4) array of (x0, y0, x1, y1), e.g., OCR textblocks
+    polygons_a (list): (Optional) Per-row polygon exterior of boxes_a or None;
+                       boxes_a must then hold the bounding box of each polygon
+
+Returns:
+    iou (np.ndarray): (N,M) float64 array
+"""
+def iou_matrix(boxes_a, boxes_b, polygons_a=None):
+    a = np.asarray(boxes_a, dtype=np.int64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.int64).reshape(-1, 4)
+
+    inter = intersection_area(a, b)
+    union = box_area(a)[:, None] + box_area(b)[None, :] - inter
+
+    iou = np.zeros(inter.shape, dtype=np.float64)
+    np.divide(inter, union, out=iou, where=union > 0)
+
+    if(polygons_a is not None):
+        index = None
+        for row, coords in enumerate(polygons_a):
+            if(coords is None or is_box(coords)):
+                continue
+            if(index is None):
+                index = BlockIndex(b)
+            iou[row] = polygon_iou(coords, b, index.query(a[row]))
+
+    return iou
+
+
+
+"""polygon_iou
+
+Args:
+    coords (list of (x, y)): Polygon exterior
+    boxes (np.ndarray): (M,4) array of (x0, y0, x1, y1)
+    candidates (list of int): (Optional) Indices of boxes worth testing (e.g., bbox overlaps)
+
+Returns:
+    iou (np.ndarray): (M,) float64 array, zero outside the candidates
+"""
+def polygon_iou(coords, boxes, candidates=None):
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    if(candidates is None):
+        candidates = np.arange(len(boxes))
+    candidates = np.asarray(candidates, dtype=np.intp)
+
+    iou = np.zeros(len(boxes), dtype=np.float64)
+    if(len(candidates) == 0):
+        return iou
+
+    polygon = _polygon(coords)
+    inter = polygon_intersection_area(polygon, boxes[candidates])
+    union = polygon.area + box_area(boxes[candidates]) - inter
+    iou[candidates] = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+    return iou
+
+
+
+"""polygon_intersection_area
+
+Boxes inside the polygon take their own area and boxes outside of it zero,
+both decided with the prepared polygon; only boxes crossing the outline are
+clipped exactly. With shapely 2 the predicates and the clipping run
+vectorized over all boxes.
+
+Args:
+    polygon (shapely Polygon): Zone outline (see _polygon)
+    boxes (np.ndarray): (M,4) array of (x0, y0, x1, y1)
+
+Returns:
+    inter (np.ndarray): (M,) float64 array of intersection areas
+"""
+def polygon_intersection_area(polygon, boxes):
+    import shapely
+
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    areas = box_area(boxes).astype(np.float64)
+
+    if(hasattr(shapely, 'box')):
+        box_polygons = shapely.box(boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3])
+        contained = shapely.contains(polygon, box_polygons)
+        crossing  = shapely.intersects(polygon, box_polygons) & ~contained
+
+        inter = np.where(contained, areas, 0.0)
+        inter[crossing] = shapely.area(shapely.intersection(polygon, box_polygons[crossing]))
+        return inter
+
+    # shapely < 2: prepared predicates, one box at a time
+    from shapely.geometry import box
+    from shapely.prepared import prep
+
+    prepared = prep(polygon)
+    inter = np.zeros(len(boxes), dtype=np.float64)
+    for idx, (x0, y0, x1, y1) in enumerate(boxes.tolist()):
+        box_polygon = box(x0, y0, x1, y1)
+        if(prepared.contains(box_polygon)):
+            inter[idx] = areas[idx]
+        elif(prepared.intersects(box_polygon)):
+            inter[idx] = polygon.intersection(box_polygon).area
+    return inter
+
+
+
+"""polygon_intersects_mask
+
+Shapely intersects predicate of a polygon against many boxes. Boxes whose
+bounding boxes do not touch the polygon's are rejected with intersects_mask
+before the exact (prepared) test.
+
+Args:
+    coords (list of (x, y)): Polygon exterior
+    boxes (np.ndarray): (M,4) array of (x0, y0, x1, y1), e.g., OCR textlines
+
+Returns:
+    mask (np.ndarray): (M,) bool array
+"""
+def polygon_intersects_mask(coords, boxes):
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    mask  = intersects_mask(polygon_bounds(coords), boxes)[0]
+
+    candidates = np.flatnonzero(mask)
+    if(len(candidates) == 0):
+        return mask
+
+    import shapely
+    polygon = _polygon(coords)
+    if(hasattr(shapely, 'box')):
+        candidate_boxes = boxes[candidates]
+        box_polygons = shapely.box(candidate_boxes[:, 0], candidate_boxes[:, 1], candidate_boxes[:, 2], candidate_boxes[:, 3])
+        mask[candidates] = shapely.intersects(polygon, box_polygons)
+    else:
+        from shapely.geometry import box
+        from shapely.prepared import prep
+
+        prepared = prep(polygon)
+        mask[candidates] = [prepared.intersects(box(*boxes[idx].tolist())) for idx in candidates]
+    return mask
+
+
+
+"""polygon_covers_points
+
+Args:
+    coords (list of (x, y)): Polygon exterior
+    points (np.ndarray): (M,2) array of (x, y)
+
+Returns:
+    mask (np.ndarray): (M,) bool array, True for points inside or on the polygon
+"""
+def polygon_covers_points(coords, points):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if(len(points) == 0):
+        return np.zeros(0, dtype=bool)
+
+    import shapely
+    polygon = _polygon(coords)
+    if(hasattr(shapely, 'intersects_xy')):
+        return shapely.intersects_xy(polygon, points[:, 0], points[:, 1])
+
+    from shapely.geometry import Point
+    from shapely.prepared import prep
+
+    prepared = prep(polygon)
+    return np.array([prepared.intersects(Point(x, y)) for x, y in points.tolist()], dtype=bool)
+
+
+
+"""polygon_bounds
+
+Args:
+    coords (list of (x, y)): Polygon exterior
+
+Returns:
+    box (np.ndarray): (4,) int64 bounding box (x0, y0, x1, y1)
+"""
+def polygon_bounds(coords):
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 2)
+    return np.concatenate([coords.min(axis=0), coords.max(axis=0)])
+
+
+
+def _polygon(coords):
+    # shapely is only needed for true polygons
+    import shapely
+    from shapely.geometry import Polygon
+
+    polygon = Polygon(coords)
+    if(hasattr(shapely, 'prepare')):
+        shapely.prepare(polygon)
+    return polygon
+
+
+
+"""intersects_mask
+
+Pairwise shapely-style intersects predicate (shared edges and corners count)
+of two sets of axis-aligned boxes.
+
+Args:
+    boxes_a (np.ndarray): (N,4) array of (x0, y0, x1, y1), e.g., zones
+    boxes_b (np.ndarray): (M,4) array of (x0, y0, x1, y1), e.g., OCR textlines
+
+Returns:
+    mask (np.ndarray): (N,M) bool array
+"""
+def intersects_mask(boxes_a, boxes_b):
+    a = np.asarray(boxes_a, dtype=np.int64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.int64).reshape(-1, 4)
+
+    return (a[:, None, 0] <= b[None, :, 2]) & (b[None, :, 0] <= a[:, None, 2]) & \
+           (a[:, None, 1] <= b[None, :, 3]) & (b[None, :, 1] <= a[:, None, 3])
@@ -8,10 +8,18 @@ Loading a model
 .. autosummary::
     LoadedModel
 
+Sharing a model between concurrent callers
+------------------------------------------
+
+.. autosummary::
+    InferenceServer
+    InferenceClient
+
 
 -----
 """
 
-__all__ = ['LoadedModel']
+__all__ = ['LoadedModel', 'InferenceServer', 'InferenceClient']
 
-from .loader import *
\ No newline at end of file
+from .loader import *
+from .server import *
\ No newline at end of file
@@ -1,9 +1,11 @@
 import tensorflow as tf
 import os
 from threading import Semaphore
+from collections import OrderedDict
 import numpy as np
 import tempfile
 from imageio import imsave, imread
+from typing import List, Union
 
 _original_shape_key = 'original_shape'
 
@@ -17,9 +19,25 @@ class LoadedModel:
     :param predict_mode: defines the input/output format of the prediction output (see `.predict()`)
     :param num_parallel_predictions: limits the number of conccurent calls of `predict` to avoid Out-Of-Memory \
     issues if predicting on GPU
+    :param session: session (and its graph) to load the model in. If `None`, the default session is used if there \
+    is one, otherwise the model owns a new session configured by the following parameters (released by `.close()`)
+    :param intra_op_threads: number of threads used inside an operation (0: one per schedulable CPU)
+    :param inter_op_threads: number of operations run in parallel (0: one per schedulable CPU)
+    :param optimizer_level: graph optimization level, ``L0`` (common subexpression elimination and constant \
+    folding disabled) or ``L1``
+    :param jit: compiles the graph with XLA (if TensorFlow was built with it)
+    :param use_gpu: if `False`, runs on CPU even if a GPU is visible
+    :param cpus: pins the process to these CPUs, list of ids or Linux CPU list string (e.g. ``'0-7,16'``). \
+    The thread pools are then sized to them
+
+    The thread pools are created with the first session of the process, so the thread settings of later \
+    sessions are ignored by TensorFlow: use one process per configuration.
     """
 
-    def __init__(self, model_base_dir, predict_mode='filename', num_parallel_predictions=2):
+    def __init__(self, model_base_dir, predict_mode='filename', num_parallel_predictions=2,
+                 session: tf.Session=None, intra_op_threads: int=0, inter_op_threads: int=0,
+                 optimizer_level: str='L1', jit: bool=False, use_gpu: bool=True,
+                 cpus: Union[str, List[int]]=None):
         if os.path.exists(os.path.join(model_base_dir, 'saved_model.pbtxt')) or \
                 os.path.exists(os.path.join(model_base_dir, 'saved_model.pb')):
             model_dir = model_base_dir
@@ -47,11 +65,24 @@ class LoadedModel:
             raise NotImplementedError
         self.predict_mode = predict_mode
 
-        self.sess = tf.get_default_session()
-        loaded_model = tf.saved_model.loader.load(self.sess, ['serve'], model_dir)
-        assert 'serving_default' in list(loaded_model.signature_def)
+        if session is None:
+            session = tf.get_default_session()
+        if session is None:
+            if cpus is not None:
+                os.sched_setaffinity(0, _parse_cpu_list(cpus))
+            session = tf.Session(graph=tf.Graph(),
+                                 config=_session_config(intra_op_threads, inter_op_threads, optimizer_level,
+                                                        jit, use_gpu))
+            self._owns_session = True
+        else:
+            self._owns_session = False
+        self.sess = session
+
+        with self.sess.graph.as_default():
+            loaded_model = tf.saved_model.loader.load(self.sess, ['serve'], model_dir)
+            assert 'serving_default' in list(loaded_model.signature_def)
 
-        input_dict, output_dict = _signature_def_to_tensors(loaded_model.signature_def[signature_def_key])
+            input_dict, output_dict = _signature_def_to_tensors(loaded_model.signature_def[signature_def_key])
         assert input_dict_key in input_dict.keys(), "{} not present in input_keys, " \
                                                     "possible values: {}".format(input_dict_key, input_dict.keys())
         self._input_tensor = input_dict[input_dict_key]
@@ -59,8 +90,17 @@ class LoadedModel:
         if predict_mode == 'resized_images':
             # This node is not defined in this specific run-mode as there is no original image
             del self._output_dict['original_shape']
+        # Models exported before the batch-capable serving input have a static batch size of 1
+        self.max_batch_size = self._input_tensor.shape[0].value if predict_mode == 'resized_images' else 1
         self.sema = Semaphore(num_parallel_predictions)
 
+    def close(self):
+        """
+        Releases the session of the model if it owns it.
+        """
+        if self._owns_session:
+            self.sess.close()
+
     def predict(self, input_tensor, prediction_key=None):
         """
         Performs the prediction from the loaded model according to the prediction mode. \n
@@ -92,6 +132,50 @@ class LoadedModel:
                 desired_output = self._output_dict
             return self.sess.run(desired_output, feed_dict={self._input_tensor: input_tensor})
 
+    def predict_batch(self, images, max_batch_size: int=8, bucket_size: int=32, prediction_key=None):
+        """
+        Predicts several images with as few session runs as possible (``resized_images`` prediction mode only).
+
+        Images are grouped by size into buckets of `bucket_size` pixels, padded (mirrored) to the largest height
+        and width of their bucket and stacked into batches of at most `max_batch_size` images. After each run,
+        the outputs are split back per image and cropped to its size.
+
+        :param images: list of images [H,W,3] float32 (0..255), already resized to the model input size
+        :param max_batch_size: maximum number of images per session run (models exported without the batch-capable \
+        serving input only accept one)
+        :param bucket_size: images whose height and width round up to the same multiple of `bucket_size` \
+        share a batch (1 to only batch identically sized images)
+        :param prediction_key: if not `None`, returns the value of the corresponding key for each image \
+        instead of the full dictionnary
+        :return: list of prediction outputs (same format as `.predict()`, with a batch dimension of 1), \
+        in the order of `images`
+        """
+        if self.predict_mode != 'resized_images':
+            raise NotImplementedError("predict_batch needs predict_mode='resized_images'")
+        if self.max_batch_size is not None:
+            max_batch_size = min(max_batch_size, self.max_batch_size)
+
+        buckets = OrderedDict()
+        for idx, image in enumerate(images):
+            h, w = image.shape[:2]
+            buckets.setdefault((-(-h // bucket_size), -(-w // bucket_size)), []).append(idx)
+
+        outputs = [None] * len(images)
+        for indices in buckets.values():
+            for start in range(0, len(indices), max_batch_size):
+                batch_indices = indices[start:start + max_batch_size]
+                shapes = [images[idx].shape[:2] for idx in batch_indices]
+                batch_h = max(h for h, _ in shapes)
+                batch_w = max(w for _, w in shapes)
+                batch = np.stack([np.pad(images[idx], [(0, batch_h - h), (0, batch_w - w), (0, 0)], mode='symmetric')
+                                  for idx, (h, w) in zip(batch_indices, shapes)]).astype(np.float32)
+
+                batch_output = self.predict(batch)
+                for i, (idx, (h, w)) in enumerate(zip(batch_indices, shapes)):
+                    output = {k: v[i:i + 1, :h, :w] for k, v in batch_output.items()}
+                    outputs[idx] = output[prediction_key] if prediction_key else output
+        return outputs
+
     def predict_with_tiles(self, filename: str, resized_size: int=None, tile_size: int=500,
                            min_overlap: float=0.2, linear_interpolation: bool=True):
 
@@ -169,6 +253,28 @@ class LoadedModel:
         return result
 
 
+def _session_config(intra_op_threads, inter_op_threads, optimizer_level, jit, use_gpu):
+    config = tf.ConfigProto(intra_op_parallelism_threads=intra_op_threads,
+                            inter_op_parallelism_threads=inter_op_threads)
+    if not use_gpu:
+        config.device_count['GPU'] = 0
+    config.graph_options.optimizer_options.opt_level = {'L0': tf.OptimizerOptions.L0,
+                                                        'L1': tf.OptimizerOptions.L1}[optimizer_level]
+    if jit:
+        config.graph_options.optimizer_options.global_jit_level = tf.OptimizerOptions.ON_1
+    return config
+
+
+def _parse_cpu_list(cpus):
+    if not isinstance(cpus, str):
+        return set(cpus)
+    cpu_ids = set()
+    for cpu_range in cpus.split(','):
+        first, _, last = cpu_range.partition('-')
+        cpu_ids.update(range(int(first), int(last or first) + 1))
+    return cpu_ids
+
+
 def _signature_def_to_tensors(signature_def):
     g = tf.get_default_graph()
     return {k: g.get_tensor_by_name(v.name) for k, v in signature_def.inputs.items()}, \
@@ -0,0 +1,377 @@
+import argparse
+import http.client
+import io
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from queue import Queue, Empty
+from threading import Thread, Lock
+from urllib.parse import urlsplit, parse_qs
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .loader import LoadedModel
+
+
+class InferenceServer:
+    """
+    Shares one loaded dhSegment model between concurrent callers.
+
+    Callers (threads of this process or clients of the HTTP API, see `.serve()`) submit images which are decoded
+    and resized in their own thread, then queued. A single batching thread takes up to `max_batch_size` queued
+    images, waiting at most `max_wait` seconds for the batch to fill, and predicts them in one session run
+    (see `LoadedModel.predict_batch`).
+
+    :param model_base_dir: the exported model directory (see `LoadedModel`)
+    :param resized_size: number of pixels of the model input, images are resized to it keeping their ratio \
+    (`input_resized_size` of the training parameters)
+    :param max_batch_size: maximum number of images per session run
+    :param max_wait: maximum time (in seconds) the first image of a batch waits for other images
+    :param bucket_size: images whose sizes round up to the same multiple of `bucket_size` pixels share a batch
+    :param session_options: session settings of the model (`intra_op_threads`, `inter_op_threads`, \
+    `optimizer_level`, `jit`, `use_gpu`, `cpus`, see `LoadedModel`)
+    """
+
+    def __init__(self, model_base_dir: str, resized_size: int=int(72e4), max_batch_size: int=8,
+                 max_wait: float=0.01, bucket_size: int=32, **session_options):
+        self.resized_size = resized_size
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.bucket_size = bucket_size
+
+        self.model = LoadedModel(model_base_dir, predict_mode='resized_images', **session_options)
+
+        self.stats = {'images': 0, 'batches': 0, 'errors': 0}
+        self._stats_lock = Lock()
+        self._queue = Queue()
+        self._batcher = Thread(target=self._batch_loop, daemon=True)
+        self._batcher.start()
+
+    def predict(self, image: np.ndarray, prediction_key=None):
+        """
+        Predicts a single image, batched with the images submitted concurrently by other callers.
+
+        :param image: image [H,W,3] uint8 or float32 (0..255) RGB, at its original size
+        :param prediction_key: if not `None`, returns the value of the corresponding key of the output dictionnary \
+        instead of the full dictionnary
+        :return: the prediction output (same format as `LoadedModel.predict()` in `resized_images` mode)
+        """
+        output = self.submit(self._resize(image)).result()
+        return output[prediction_key] if prediction_key else output
+
+    def predict_file(self, filename_or_buffer, prediction_key=None):
+        """
+        Same as `.predict()` from an image file, decoded at the smallest JPEG scale (1/2, 1/4 or 1/8) that is still
+        larger than the model input.
+
+        :param filename_or_buffer: path to the image file or file-like object with its content
+        :param prediction_key: see `.predict()`
+        :return: the prediction output
+        """
+        output = self.submit(self._load_resized(filename_or_buffer)).result()
+        return output[prediction_key] if prediction_key else output
+
+    def submit(self, resized_image: np.ndarray) -> Future:
+        """
+        Queues an image already resized to the model input size.
+
+        :param resized_image: image [H,W,3] float32 (0..255) RGB
+        :return: a future holding the prediction output
+        """
+        future = Future()
+        self._queue.put((resized_image, future))
+        return future
+
+    def close(self):
+        """
+        Stops the batching thread once the queued images are predicted and releases the model session.
+        """
+        self._queue.put(None)
+        self._batcher.join()
+        self.model.close()
+
+    def serve(self, port: int=None, socket_path: str=None, host: str='127.0.0.1', root: str=None):
+        """
+        Serves the model over HTTP, on a local TCP port or on a Unix socket, until interrupted.
+
+        API:
+            * ``POST /predict[?outputs=labels,probs][&resized_size=N]`` with an encoded image as body, or a JSON \
+            ``{"filename": "<path readable by the server>"}`` (``Content-Type: application/json``). \
+            Returns the requested outputs (default: ``labels``) as a ``.npz`` archive. Requests whose \
+            ``resized_size`` differs from the server's are rejected.
+            * ``GET /stats`` returns the number of images, batches and errors as JSON.
+
+        Images are resized with OpenCV (bilinear) rather than in the graph, so predictions can differ slightly from
+        those of `LoadedModel` in `image` or `filename` mode.
+
+        :param port: TCP port to listen on (on `host`)
+        :param socket_path: path of the Unix socket to listen on (instead of `port`)
+        :param host: interface to listen on with `port`
+        :param root: if set, only image files under this directory can be named in requests. Otherwise files can \
+        only be named over the Unix socket or a loopback `host`, other clients must send the image content
+        """
+        local = socket_path is not None or _is_loopback(host)
+        handler = _make_handler(self, local, root)
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            httpd = _UnixHTTPServer(socket_path, handler)
+            print("Serving on unix:{}".format(socket_path))
+        else:
+            httpd = _ThreadingHTTPServer((host, port), handler)
+            print("Serving on http://{}:{}".format(host, port))
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+            if socket_path is not None and os.path.exists(socket_path):
+                os.remove(socket_path)
+
+    def _resized_shape(self, h: int, w: int):
+        # Same computation as `dh_segment.io.input_utils.resize_image`
+        new_h = np.sqrt(self.resized_size / (w / h))
+        return int(new_h), int(self.resized_size / new_h)
+
+    def _resize(self, image: np.ndarray) -> np.ndarray:
+        new_h, new_w = self._resized_shape(*image.shape[:2])
+        return cv2.resize(np.asarray(image, np.float32), (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    def _load_resized(self, filename_or_buffer) -> np.ndarray:
+        with Image.open(filename_or_buffer) as image:
+            new_h, new_w = self._resized_shape(image.height, image.width)
+            # JPEGs are decoded at the smallest DCT scale still larger than the requested size
+            image.draft('RGB', (new_w, new_h))
+            image = np.asarray(image.convert('RGB'))
+        return self._resize(image)
+
+    def _batch_loop(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except Empty:
+                    break
+                if request is None:
+                    # Predict the current batch before stopping
+                    self._queue.put(None)
+                    break
+                batch.append(request)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        images, futures = zip(*batch)
+        try:
+            outputs = self.model.predict_batch(list(images), max_batch_size=self.max_batch_size,
+                                               bucket_size=self.bucket_size)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            with self._stats_lock:
+                self.stats['errors'] += len(batch)
+            return
+        for future, output in zip(futures, outputs):
+            future.set_result(output)
+        with self._stats_lock:
+            self.stats['images'] += len(batch)
+            self.stats['batches'] += 1
+
+
+class InferenceClient:
+    """
+    Client of an `InferenceServer` serving over HTTP, with the `predict` interface of `LoadedModel` in `filename` mode.
+
+    :param address: ``http://host:port`` or the path of the Unix socket of the server
+    :param outputs: names of the prediction outputs to retrieve
+    :param resized_size: if not `None`, the model input size (in pixels) the server must use, requests fail otherwise
+    """
+
+    def __init__(self, address: str, outputs=('labels',), resized_size: int=None):
+        self.address = address
+        self.outputs = list(outputs)
+        self.resized_size = resized_size
+
+    def predict(self, filename: str, prediction_key=None, send_content: bool=None):
+        """
+        :param filename: path to the image file
+        :param prediction_key: if not `None`, returns the value of the corresponding key of the output dictionnary \
+        instead of the full dictionnary
+        :param send_content: sends the file content instead of its path (for servers that cannot read the file). \
+        By default, paths are only sent to servers on a Unix socket or a loopback address
+        :return: the prediction output
+        """
+        if send_content is None:
+            send_content = self.address.startswith('http://') and not _is_loopback(urlsplit(self.address).hostname)
+        if send_content:
+            with open(filename, 'rb') as f:
+                body, content_type = f.read(), 'application/octet-stream'
+        else:
+            body, content_type = json.dumps({'filename': os.path.abspath(filename)}), 'application/json'
+
+        outputs = [prediction_key] if prediction_key else self.outputs
+        url = '/predict?outputs={}'.format(','.join(outputs))
+        if self.resized_size is not None:
+            url += '&resized_size={}'.format(self.resized_size)
+        response = self._request('POST', url, body, {'Content-Type': content_type})
+        with np.load(io.BytesIO(response)) as archive:
+            result = {k: archive[k] for k in archive.files}
+        return result[prediction_key] if prediction_key else result
+
+    def stats(self) -> dict:
+        return json.loads(self._request('GET', '/stats').decode('utf-8'))
+
+    def _request(self, method, url, body=None, headers=None):
+        if self.address.startswith('http://'):
+            connection = http.client.HTTPConnection(urlsplit(self.address).netloc)
+        else:
+            connection = _UnixHTTPConnection(self.address)
+        try:
+            connection.request(method, url, body, headers or {})
+            response = connection.getresponse()
+            content = response.read()
+            if response.status != 200:
+                raise RuntimeError("Inference server error {}: {}".format(response.status,
+                                                                          content.decode('utf-8', 'replace')))
+            return content
+        finally:
+            connection.close()
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == 'localhost'
+
+
+def _make_handler(server: InferenceServer, local: bool, root: str=None):
+    root_dir = os.path.realpath(root) if root is not None else None
+
+    def can_read(filename):
+        # Files named by clients are only opened under `root`, or for local clients if no root is set
+        if root_dir is None:
+            return local
+        return os.path.commonpath([root_dir, os.path.realpath(filename)]) == root_dir
+
+    class _InferenceRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if urlsplit(self.path).path != '/stats':
+                return self._send_error(404, 'unknown path')
+            with server._stats_lock:
+                self._send(json.dumps(server.stats).encode('utf-8'), 'application/json')
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if url.path != '/predict':
+                return self._send_error(404, 'unknown path')
+            query = parse_qs(url.query)
+            outputs = query.get('outputs', ['labels'])[0].split(',')
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            try:
+                if 'resized_size' in query and int(query['resized_size'][0]) != server.resized_size:
+                    return self._send_error(400, 'the server resizes images to {} pixels, not {}'.format(
+                        server.resized_size, query['resized_size'][0]))
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    filename = json.loads(body.decode('utf-8'))['filename']
+                    if not can_read(filename):
+                        return self._send_error(403, 'image files cannot be named over this address, '
+                                                     'send the image content instead')
+                    output = server.predict_file(filename)
+                else:
+                    output = server.predict_file(io.BytesIO(body))
+                unknown_outputs = set(outputs) - set(output)
+                if unknown_outputs:
+                    return self._send_error(400, 'unknown outputs {}, possible values: {}'.format(
+                        sorted(unknown_outputs), sorted(output)))
+            except (OSError, KeyError, ValueError) as e:
+                return self._send_error(400, str(e))
+            except Exception as e:
+                return self._send_error(500, str(e))
+
+            archive = io.BytesIO()
+            np.savez(archive, **{k: output[k] for k in outputs})
+            self._send(archive.getvalue(), 'application/octet-stream')
+
+        def _send(self, content, content_type, status=200):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def _send_error(self, status, message):
+            self._send(message.encode('utf-8'), 'text/plain', status)
+
+        def log_message(self, format, *args):
+            # No per-request logging (and no client address on Unix sockets)
+            pass
+
+    return _InferenceRequestHandler
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path):
+        super().__init__('localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a dhSegment model to concurrent local clients')
+    parser.add_argument('model_dir', type=str, help='exported model directory')
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument('--port', type=int, help='local TCP port to listen on')
+    address.add_argument('--socket', type=str, help='path of the Unix socket to listen on')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='interface to listen on with --port')
+    parser.add_argument('--root', type=str, default=None,
+                        help='directory of the image files clients can name (default: any file, loopback and '
+                             'Unix socket clients only)')
+    parser.add_argument('--resized-size', type=int, default=int(72e4), help='number of pixels of the model input')
+    parser.add_argument('--max-batch-size', type=int, default=8, help='maximum number of images per session run')
+    parser.add_argument('--max-wait', type=float, default=10,
+                        help='maximum time (in ms) an image waits for a batch to fill')
+    parser.add_argument('--intra-op-threads', type=int, default=0, help='threads used inside an operation')
+    parser.add_argument('--inter-op-threads', type=int, default=0, help='operations run in parallel')
+    parser.add_argument('--optimizer-level', type=str, default='L1', choices=['L0', 'L1'],
+                        help='graph optimization level')
+    parser.add_argument('--cpus', type=str, default=None, help='CPUs to pin the server to (e.g. 0-7,16)')
+    parser.add_argument('--cpu-only', action='store_true', help='do not use the GPU')
+    args = parser.parse_args()
+
+    inference_server = InferenceServer(args.model_dir, resized_size=args.resized_size,
+                                       max_batch_size=args.max_batch_size, max_wait=args.max_wait / 1000,
+                                       intra_op_threads=args.intra_op_threads,
+                                       inter_op_threads=args.inter_op_threads,
+                                       optimizer_level=args.optimizer_level, cpus=args.cpus,
+                                       use_gpu=not args.cpu_only)
+    try:
+        inference_server.serve(port=args.port, socket_path=args.socket, host=args.host, root=args.root)
+    finally:
+        inference_server.close()
@@ -242,7 +242,7 @@ def serving_input_filename(resized_size):
         # define placeholder for filename
         filename = tf.placeholder(dtype=tf.string)
 
-        # TODO : make it batch-compatible (with Dataset or string input producer)
+        # The filename input decodes a single image, batches go through `from_resized_images`
         decoded_image = tf.to_float(tf.image.decode_jpeg(tf.read_file(filename), channels=3,
                                                          try_recover_truncated=True))
         original_shape = tf.shape(decoded_image)[:2]
@@ -252,7 +252,8 @@ def serving_input_filename(resized_size):
         else:
             image = decoded_image
 
-        image_batch = image[None]
+        # Defaults to the single decoded image, but can be fed a batch [N,H,W,3] of equally sized resized images
+        image_batch = tf.placeholder_with_default(image[None], shape=[None, None, None, 3], name='resized_images')
         features = {'images': image_batch, 'original_shape': original_shape}
 
         receiver_inputs = {'filename': filename}
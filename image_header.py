@@ -0,0 +1,144 @@
+import struct
+
+import cv2
+import numpy as np
+
+
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, ...); C4, C8 and CC are not frames
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+PNG_SIGNATURE    = b'\x89PNG\r\n\x1a\n'
+TIFF_SIGNATURES  = (b'II*\x00', b'MM\x00*')
+
+# Reduction factor -> imread flag decoding a JPEG at that scale (DCT scaling)
+REDUCED_DECODE_FLAGS = {8: cv2.IMREAD_REDUCED_COLOR_8,
+                        4: cv2.IMREAD_REDUCED_COLOR_4,
+                        2: cv2.IMREAD_REDUCED_COLOR_2,
+                        1: cv2.IMREAD_COLOR}
+
+# TIFF tags and field types
+TIFF_IMAGE_WIDTH  = 256
+TIFF_IMAGE_LENGTH = 257
+TIFF_SHORT        = 3
+TIFF_LONG         = 4
+
+
+
+"""image_size
+
+Reads the dimensions of a JPEG, PNG or TIFF image from its header, without
+decoding the pixels. The dimensions are the stored ones, i.e., the EXIF
+orientation is ignored (as in tf.image.decode_jpeg).
+
+Args:
+    image_file_path (str): Path to the image file
+
+Returns:
+    height (int): Image height in pixels
+    width (int): Image width in pixels
+
+Raises:
+    ValueError: If the file is not a JPEG, PNG or TIFF image or its header is truncated
+"""
+def image_size(image_file_path):
+    with open(image_file_path, 'rb') as image_fp:
+        signature = image_fp.read(8)
+        image_fp.seek(0)
+        if signature[:2] == b'\xff\xd8':
+            return _jpeg_size(image_fp)
+        if signature == PNG_SIGNATURE:
+            return _png_size(image_fp)
+        if signature[:4] in TIFF_SIGNATURES:
+            return _tiff_size(image_fp)
+    raise ValueError("{}: not a JPEG, PNG or TIFF image".format(image_file_path))
+
+
+
+"""read_reduced
+
+Decodes an image at the coarsest scale (1/2, 1/4 or 1/8, DCT scaling for
+JPEGs) that still has at least min_pixels pixels. Like image_size, the EXIF
+orientation is ignored.
+
+Args:
+    image_file_path (str): Path to the image file
+    min_pixels (int): Minimum number of pixels of the decoded image (e.g., the model input size)
+
+Returns:
+    image (np.ndarray): RGB float32 image (0..255)
+    factor (int): Reduction factor the image was decoded at
+
+Raises:
+    ValueError: If the image cannot be read or decoded
+"""
+def read_reduced(image_file_path, min_pixels):
+    height, width = image_size(image_file_path)
+    factor = max(f for f in REDUCED_DECODE_FLAGS if f == 1 or -(-height//f) * -(-width//f) >= min_pixels)
+
+    image = cv2.imread(image_file_path, REDUCED_DECODE_FLAGS[factor] | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        raise ValueError("{}: cannot decode image".format(image_file_path))
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB).astype(np.float32), factor
+
+
+
+def _read(image_fp, size):
+    data = image_fp.read(size)
+    if len(data) != size:
+        raise ValueError("{}: truncated image header".format(image_fp.name))
+    return data
+
+
+
+def _jpeg_size(image_fp):
+    # Walk the marker segments up to the first start-of-frame
+    image_fp.seek(2)
+    while True:
+        marker = _read(image_fp, 2)
+        while marker[1] == 0xFF:
+            # Fill bytes
+            marker = marker[1:] + _read(image_fp, 1)
+        if marker[0] != 0xFF:
+            raise ValueError("{}: corrupt JPEG marker".format(image_fp.name))
+        if marker[1] == 0x01 or 0xD0 <= marker[1] <= 0xD7:
+            # Markers without a segment
+            continue
+        if marker[1] == 0xD9:
+            raise ValueError("{}: JPEG without a frame header".format(image_fp.name))
+
+        length, = struct.unpack('>H', _read(image_fp, 2))
+        if marker[1] in JPEG_SOF_MARKERS:
+            _, height, width = struct.unpack('>BHH', _read(image_fp, 5))
+            return height, width
+        image_fp.seek(length - 2, 1)
+
+
+
+def _png_size(image_fp):
+    # The IHDR chunk always comes first
+    image_fp.seek(8)
+    _, chunk_type, width, height = struct.unpack('>I4sII', _read(image_fp, 16))
+    if chunk_type != b'IHDR':
+        raise ValueError("{}: PNG without an IHDR chunk".format(image_fp.name))
+    return height, width
+
+
+
+def _tiff_size(image_fp):
+    # Dimensions of the first image file directory
+    endian = '<' if _read(image_fp, 2) == b'II' else '>'
+    _, ifd_offset = struct.unpack(endian + 'HI', _read(image_fp, 6))
+    image_fp.seek(ifd_offset)
+    num_entries, = struct.unpack(endian + 'H', _read(image_fp, 2))
+
+    size = {}
+    for _ in range(num_entries):
+        tag, field_type, _, value = struct.unpack(endian + 'HHI4s', _read(image_fp, 12))
+        if tag in (TIFF_IMAGE_WIDTH, TIFF_IMAGE_LENGTH):
+            if field_type == TIFF_SHORT:
+                size[tag], = struct.unpack(endian + 'H', value[:2])
+            elif field_type == TIFF_LONG:
+                size[tag], = struct.unpack(endian + 'I', value)
+    if len(size) != 2:
+        raise ValueError("{}: TIFF without image dimensions".format(image_fp.name))
+    return size[TIFF_IMAGE_LENGTH], size[TIFF_IMAGE_WIDTH]
@@ -0,0 +1,119 @@
+import os
+import json
+import sqlite3
+
+
+
+"""Manifest
+
+SQLite manifest of completed page pairs, stored in the save directory. Each
+entry records the size and mtime of both input files, the mapping parameters
+and the output path(s), newline separated. The whole table is loaded into memory when the manifest
+is opened, so deciding whether a pair can be skipped costs two os.stat calls
+and a dict lookup.
+
+Args:
+    save_path (str): Path to save directory
+    filename (str): Name of the manifest file within save_path
+    commit_every (int): Number of recorded pages between two commits (None: only commit on close)
+"""
+class Manifest(object):
+    def __init__(self, save_path, filename='manifest.sqlite', commit_every=256):
+        self.path         = os.path.join(save_path, filename)
+        self.commit_every = commit_every
+        self._pending     = 0
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS pages ('
+                          'zone_path TEXT NOT NULL, '
+                          'ocr_path TEXT NOT NULL, '
+                          'zone_size INTEGER, zone_mtime_ns INTEGER, '
+                          'ocr_size INTEGER, ocr_mtime_ns INTEGER, '
+                          'params TEXT, '
+                          'output_path TEXT, '
+                          'PRIMARY KEY (zone_path, ocr_path))')
+        self.conn.commit()
+
+        self._entries = {}
+        for row in self.conn.execute('SELECT * FROM pages'):
+            self._entries[(row[0], row[1])] = row[2:]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    """fingerprint
+
+    Args:
+        zone_xml_file_path (str): Path to Segmented output xml file
+        ocr_xml_file_path (str): Path to OCR xml file
+
+    Returns:
+        fingerprint (tuple): (zone_size, zone_mtime_ns, ocr_size, ocr_mtime_ns)
+    """
+    @staticmethod
+    def fingerprint(zone_xml_file_path, ocr_xml_file_path):
+        zone_stat = os.stat(zone_xml_file_path)
+        ocr_stat  = os.stat(ocr_xml_file_path)
+        return (zone_stat.st_size, zone_stat.st_mtime_ns, ocr_stat.st_size, ocr_stat.st_mtime_ns)
+
+    """is_done
+
+    Args:
+        zone_xml_file_path (str): Path to Segmented output xml file
+        ocr_xml_file_path (str): Path to OCR xml file
+        params (dict): Mapping parameters (e.g., {'iou_threshold': 0.1})
+        fingerprint (tuple): (Optional) Precomputed Manifest.fingerprint
+
+    Returns:
+        (bool): True if the pair was mapped with the same inputs and parameters
+                and all its outputs still exist
+    """
+    def is_done(self, zone_xml_file_path, ocr_xml_file_path, params, fingerprint=None):
+        entry = self._entries.get((zone_xml_file_path, ocr_xml_file_path))
+        if(entry is None):
+            return False
+        if(fingerprint is None):
+            fingerprint = self.fingerprint(zone_xml_file_path, ocr_xml_file_path)
+        return tuple(entry[:4]) == fingerprint and \
+               entry[4] == _params_key(params) and \
+               all(os.path.exists(output_path) for output_path in entry[5].split('\n'))
+
+    """record
+
+    Args:
+        zone_xml_file_path (str): Path to Segmented output xml file
+        ocr_xml_file_path (str): Path to OCR xml file
+        params (dict): Mapping parameters
+        output_paths (list of str): Paths to the stored outputs (e.g., one per swept IoU threshold)
+        fingerprint (tuple): Manifest.fingerprint of the inputs as they were mapped
+    """
+    def record(self, zone_xml_file_path, ocr_xml_file_path, params, output_paths, fingerprint):
+        entry = tuple(fingerprint) + (_params_key(params), '\n'.join(output_paths))
+        self._entries[(zone_xml_file_path, ocr_xml_file_path)] = entry
+        self.conn.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                          (zone_xml_file_path, ocr_xml_file_path) + entry)
+
+        self._pending += 1
+        if(self.commit_every is not None and self._pending >= self.commit_every):
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+
+def _params_key(params):
+    return json.dumps(params, sort_keys=True)
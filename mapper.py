@@ -0,0 +1,284 @@
+import os
+import numpy as np
+from tqdm import tqdm
+
+from alto import ParsedAltoPage, read_alto
+from box_geometry import to_boxes, scale_rects, box_coords, is_box, polygon_bounds, iou_matrix, intersects_mask, \
+                         polygon_intersects_mask, polygon_covers_points
+from spatial_index import GridIndex
+from timing import stage
+
+
+
+# Units assigned to zones to build their zone texts: OCR TextLines or Strings
+GRANULARITIES = ('line', 'word')
+
+
+
+"""mapping
+
+Args:
+    zone_textBlocks (ParsedAltoPage): Returned object from process_zone
+    ocr_textBlocks (ParsedAltoPage): Returned object from process_ocr
+    factor (float): factor = image_size / actual_scanned_image_size
+    usecase (int): One of following options
+        1: OCR only
+        2: OCR + Segmentation
+        3: OCR + Segmentation (exclusive)
+    iou_threshold (float): Threshold for intersection over union
+    progress (bool): Show a progress bar
+    with_iou (bool): Also store the IoU of each matched OCR textblock under "ocr_ious" (usecase 2 and 3)
+    timer (StageTimer): (Optional) Records the text, index and match stages
+    granularity (str): Build zone texts from the TextLines ('line') or the Strings ('word')
+                       of the matched OCR textblocks that fall in the zone (usecase 2 and 3)
+    
+Returns:
+    map_json (json object): Final mapped result in JSON format
+"""
+def mapping(zone_textBlocks=None, ocr_textBlocks=None, factor=1.0, usecase=1, iou_threshold=0.05, progress=True, with_iou=False, timer=None, granularity='line'):
+    # output json
+    map_json = []
+    
+    # USECASE 1
+    if(usecase==1):
+        # Scaled OCR textblock boxes and texts
+        ocr_boxes = to_boxes(scale_rects(ocr_textBlocks.blocks, factor))
+        with stage(timer, 'text'):
+            ocr_texts = ocr_textBlocks.block_texts()
+
+        for ocr_idx in tqdm(range(len(ocr_boxes)), disable=not progress):
+            # Build json
+            _textBlock_xml = {}
+
+            # Build json
+            _textBlock_xml["ocr_coords"] = box_coords(ocr_boxes[ocr_idx])
+            _textBlock_xml["ocr_texts"]  = ocr_texts[ocr_idx]
+            map_json.append(_textBlock_xml)
+
+            
+            
+    # USECASE 2 and 3
+    else:
+        zone_coords, matches = _match_zones(zone_textBlocks, ocr_textBlocks, factor, iou_threshold, progress, timer, granularity)
+        with stage(timer, 'match'):
+            map_json = _zone_records(zone_coords, matches, iou_threshold, with_iou)
+
+    return map_json
+
+
+
+"""mapping_sweep
+
+Usecase 2 mapping for several IoU thresholds at once. The IoU matrix and the
+zone texts are computed once for the lowest threshold, and every threshold
+only filters the matches, so a sweep costs about as much as a single mapping.
+
+Args:
+    zone_textBlocks (ParsedAltoPage): Returned object from process_zone
+    ocr_textBlocks (ParsedAltoPage): Returned object from process_ocr
+    factor (float): factor = image_size / actual_scanned_image_size
+    iou_thresholds (list of float): Thresholds for intersection over union
+    progress (bool): Show a progress bar
+    with_iou (bool): Also store the IoU of each matched OCR textblock under "ocr_ious"
+    timer (StageTimer): (Optional) Records the text, index and match stages
+    granularity (str): 'line' or 'word' (see mapping)
+
+Returns:
+    map_jsons (dict): iou_threshold -> map_json, identical to mapping(..., iou_threshold=iou_threshold)
+"""
+def mapping_sweep(zone_textBlocks=None, ocr_textBlocks=None, factor=1.0, iou_thresholds=(0.05,), progress=True, with_iou=False, timer=None, granularity='line'):
+    zone_coords, matches = _match_zones(zone_textBlocks, ocr_textBlocks, factor, min(iou_thresholds), progress, timer, granularity)
+    with stage(timer, 'match'):
+        return {iou_threshold: _zone_records(zone_coords, matches, iou_threshold, with_iou) for iou_threshold in iou_thresholds}
+
+
+
+"""_match_zones
+
+Zones with a polygon outline (see ParsedAltoPage.block_polygon) are matched
+on their polygon: the IoU and the textline test are exact, but only run on
+the OCR boxes whose bounding boxes overlap the polygon's.
+
+With granularity='word', the zone text of a matched OCR textblock is built
+from its Strings whose box center lies in the zone, instead of its
+TextLines intersecting the zone, so a line straddling two zones is split
+between them. Strings are looked up in a per-page GridIndex, so each zone
+only tests the words around it.
+
+Args:
+    zone_textBlocks (ParsedAltoPage): Returned object from process_zone
+    ocr_textBlocks (ParsedAltoPage): Returned object from process_ocr
+    factor (float): factor = image_size / actual_scanned_image_size
+    min_iou (float): Lowest threshold for intersection over union
+    progress (bool): Show a progress bar
+    timer (StageTimer): (Optional) Records the text, index and match stages
+    granularity (str): 'line' or 'word'
+
+Returns:
+    zone_coords (list): Per zone, its outline in the output JSON format
+    matches (list): Per zone, a list of (iou, ocr_coords, ocr_text, zone_text) of the
+                    OCR textblocks with iou >= min_iou, in document order
+"""
+def _match_zones(zone_textBlocks, ocr_textBlocks, factor, min_iou, progress, timer=None, granularity='line'):
+    if granularity not in GRANULARITIES:
+        raise ValueError("Unknown granularity {} (expected one of {})".format(granularity, ', '.join(GRANULARITIES)))
+
+    # Textblock and textline/string texts, assembled once per page
+    with stage(timer, 'text'):
+        ocr_texts = ocr_textBlocks.block_texts()
+        if granularity == 'word':
+            unit_texts  = ocr_textBlocks.string_texts()
+            unit_ranges = ocr_textBlocks.line_strings[ocr_textBlocks.block_lines].tolist()
+        else:
+            unit_texts  = ocr_textBlocks.line_texts()
+            unit_ranges = ocr_textBlocks.block_lines.tolist()
+
+    with stage(timer, 'index'):
+        # Zone and (scaled) OCR textblock/textline boxes
+        zone_boxes = to_boxes(zone_textBlocks.blocks)
+        ocr_boxes  = to_boxes(scale_rects(ocr_textBlocks.blocks, factor))
+        if granularity == 'word':
+            str_boxes   = to_boxes(scale_rects(ocr_textBlocks.strings, factor))
+            str_centers = (str_boxes[:, :2] + str_boxes[:, 2:]) / 2.0
+            word_index  = GridIndex(str_boxes)
+        else:
+            txt_boxes   = to_boxes(scale_rects(ocr_textBlocks.lines, factor))
+
+        # Polygon zones (rectangular outlines are handled as boxes)
+        zone_polygons = None
+        if zone_textBlocks.has_polygons():
+            zone_polygons = [zone_textBlocks.block_polygon(zone_idx) for zone_idx in range(len(zone_boxes))]
+            zone_polygons = [coords if coords is not None and not is_box(coords) else None for coords in zone_polygons]
+            for zone_idx, coords in enumerate(zone_polygons):
+                if coords is not None:
+                    zone_boxes[zone_idx] = polygon_bounds(coords)
+
+    zone_coords = []
+    matches = []
+    with stage(timer, 'match'):
+        # IoU of every zone against every OCR textblock (incl. polygon clipping)
+        ious = iou_matrix(zone_boxes, ocr_boxes, zone_polygons)
+
+        for zone_idx in tqdm(range(len(zone_boxes)), disable=not progress):
+            zone_box = zone_boxes[zone_idx]
+            zone_polygon = zone_polygons[zone_idx] if zone_polygons is not None else None
+            zone_coords.append(box_coords(zone_box) if zone_polygon is None else zone_polygon.tolist())
+
+            # Find matching regions
+            zone_matches = []
+            matched = np.flatnonzero(ious[zone_idx] >= min_iou)
+            if len(matched) == 0:
+                matches.append(zone_matches)
+                continue
+
+            # Subset of OCR within the Zone: textlines intersecting the Zone or strings centered in it
+            if granularity == 'word':
+                unit_hits  = np.zeros(len(unit_texts), dtype=bool)
+                candidates = word_index.query(zone_box, touching=True)
+                if zone_polygon is None:
+                    centers = str_centers[candidates]
+                    inside  = (centers[:, 0] >= zone_box[0]) & (centers[:, 0] <= zone_box[2]) & \
+                              (centers[:, 1] >= zone_box[1]) & (centers[:, 1] <= zone_box[3])
+                else:
+                    inside  = polygon_covers_points(zone_polygon, str_centers[candidates])
+                unit_hits[candidates[inside]] = True
+            elif zone_polygon is None:
+                unit_hits = intersects_mask(zone_box, txt_boxes)[0]
+            else:
+                unit_hits = polygon_intersects_mask(zone_polygon, txt_boxes)
+
+            for ocr_idx in matched:
+                start, stop  = unit_ranges[ocr_idx], unit_ranges[ocr_idx+1]
+                sub_contents = ''.join([unit_texts[start + unit_idx] for unit_idx in np.flatnonzero(unit_hits[start:stop])])
+
+                zone_matches.append((float(ious[zone_idx, ocr_idx]), box_coords(ocr_boxes[ocr_idx]), ocr_texts[ocr_idx], sub_contents))
+            matches.append(zone_matches)
+
+    return zone_coords, matches
+
+
+
+"""_zone_records
+
+Args:
+    zone_coords (list): Returned object from _match_zones
+    matches (list): Returned object from _match_zones
+    iou_threshold (float): Threshold for intersection over union
+    with_iou (bool): Also store the IoU of each matched OCR textblock under "ocr_ious"
+
+Returns:
+    map_json (json object): Final mapped result in JSON format
+"""
+def _zone_records(zone_coords, matches, iou_threshold, with_iou):
+    map_json = []
+    for zone_coord, zone_matches in zip(zone_coords, matches):
+        zone_matches = [match for match in zone_matches if match[0] >= iou_threshold]
+
+        # Build json
+        _textBlock_xml = {}
+        _textBlock_xml["zone_coord"] = zone_coord
+        _textBlock_xml["zone_texts"] = [match[3] for match in zone_matches]
+        _textBlock_xml["ocr_coords"] = [match[1] for match in zone_matches]
+        _textBlock_xml["ocr_texts"]  = [match[2] for match in zone_matches]
+        if(with_iou):
+            _textBlock_xml["ocr_ious"] = [match[0] for match in zone_matches]
+        map_json.append(_textBlock_xml)
+
+    return map_json
+
+
+
+"""load_page
+
+Args:
+    source (str, os.PathLike, bytes, file object or ParsedAltoPage): Zone or OCR xml file,
+        its content, an open binary file, or an already parsed page
+
+Returns:
+    page (ParsedAltoPage): Parsed page (source itself if it is already parsed)
+"""
+def load_page(source):
+    if isinstance(source, ParsedAltoPage):
+        return source
+    if isinstance(source, (str, bytes, bytearray, os.PathLike)) or hasattr(source, 'read'):
+        return read_alto(source)
+    raise TypeError("Cannot read a page from {}".format(type(source).__name__))
+
+
+
+"""map_page
+
+In-process entry point for mapping one zone/OCR page pair. It has no
+argparse, sys.exit or plotting side effects, so long-lived workers can
+import it once and call it repeatedly.
+
+Args:
+    zone_source: Segmented output xml (see load_page for the accepted types)
+    ocr_source: OCR xml (see load_page for the accepted types)
+    iou_threshold (float): Threshold for intersection over union
+    usecase (int): See mapping (default: 2, zones with all related OCR contents)
+    factor (float): (Optional) OCR-to-zone coordinate scale; by default the ratio of
+                    the zone page WIDTH to the OCR page WIDTH
+    with_iou (bool): Also store the IoU of each matched OCR textblock
+    granularity (str): 'line' or 'word' (see mapping)
+
+Returns:
+    map_json (json object): Final mapped result in JSON format
+"""
+def map_page(zone_source, ocr_source, iou_threshold=0.1, usecase=2, factor=None, with_iou=False, granularity='line'):
+    zone_page = load_page(zone_source)
+    ocr_page  = load_page(ocr_source)
+
+    if(factor is None):
+        if(not zone_page.width or not ocr_page.width):
+            raise ValueError("Page WIDTH is missing, cannot derive the OCR-to-zone factor")
+        factor = zone_page.width/ocr_page.width
+
+    return mapping(zone_textBlocks=zone_page,
+                   ocr_textBlocks=ocr_page,
+                   factor=factor,
+                   usecase=usecase,
+                   iou_threshold=iou_threshold,
+                   progress=False,
+                   with_iou=with_iou,
+                   granularity=granularity)
@@ -0,0 +1,206 @@
+import os
+import hashlib
+import numpy as np
+
+from alto import ParsedAltoPage, read_alto
+
+
+
+"""
+Binary layout of a cached page (little endian, every section 8-byte aligned):
+
+    HEADER_DTYPE record
+    blocks          (B,4) int32
+    lines           (L,4) int32
+    strings         (S,4) int32
+    block_lines     (B+1,) int32
+    line_strings    (L+1,) int32
+    content_offsets (S+1,) int32   -- character offsets into the decoded content
+    polygon_offsets (B+1,) int32
+    polygon_points  (P,2) int32
+    settings        UTF-8 bytes
+    content         UTF-8 bytes
+
+Bump CACHE_VERSION whenever the layout or the parser output changes; files
+written by another version are treated as stale and rebuilt.
+"""
+CACHE_MAGIC   = b'Z2OCACHE'
+CACHE_VERSION = 3
+CACHE_SUFFIX  = '.altocache'
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('pad', '<u4'),
+    ('source_size', '<i8'),
+    ('source_mtime_ns', '<i8'),
+    ('width', '<i8'),
+    ('height', '<i8'),
+    ('num_blocks', '<i8'),
+    ('num_lines', '<i8'),
+    ('num_strings', '<i8'),
+    ('num_points', '<i8'),
+    ('settings_bytes', '<i8'),
+    ('content_bytes', '<i8'),
+])
+
+# Pages without a WIDTH/HEIGHT are stored with this marker
+_MISSING = -1
+
+
+
+"""cache_path
+
+Args:
+    cache_dir (str): Path to the cache directory
+    xml_file_path (str): Path to the ALTO xml file
+
+Returns:
+    path (str): Cache file of the xml file, named after its absolute path
+"""
+def cache_path(cache_dir, xml_file_path):
+    key = hashlib.sha1(os.path.abspath(xml_file_path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, key + CACHE_SUFFIX)
+
+
+
+"""save_page
+
+Args:
+    path (str): Path to the cache file to write
+    page (ParsedAltoPage): Parsed page
+    source_stat (os.stat_result): Stat of the xml file the page was parsed from
+"""
+def save_page(path, page, source_stat):
+    settings = page.settings.encode('utf-8')
+    content  = page.content.encode('utf-8')
+
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['magic']           = CACHE_MAGIC
+    header['version']         = CACHE_VERSION
+    header['source_size']     = source_stat.st_size
+    header['source_mtime_ns'] = source_stat.st_mtime_ns
+    header['width']           = _MISSING if page.width is None else page.width
+    header['height']          = _MISSING if page.height is None else page.height
+    header['num_blocks']      = len(page.blocks)
+    header['num_lines']       = len(page.lines)
+    header['num_strings']     = len(page.strings)
+    header['num_points']      = len(page.polygon_points)
+    header['settings_bytes']  = len(settings)
+    header['content_bytes']   = len(content)
+
+    sections = [header.tobytes()] + \
+               [np.ascontiguousarray(array, dtype='<i4').tobytes() for array in _arrays(page)] + \
+               [settings, content]
+
+    # Write to a temporary file first so readers never see a partial cache
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, 'wb') as cache_fp:
+        for section in sections:
+            cache_fp.write(section)
+            cache_fp.write(b'\0' * (-len(section) % 8))
+    os.replace(tmp_path, path)
+
+
+
+"""load_page
+
+Args:
+    path (str): Path to the cache file
+    source_stat (os.stat_result): (Optional) Current stat of the xml file; the
+                                  cache is rejected if size or mtime differ
+
+Returns:
+    page (ParsedAltoPage): Page whose arrays are read-only views of the memory
+                           mapped file, or None if the cache is missing or stale
+"""
+def load_page(path, source_stat=None):
+    try:
+        buf = np.memmap(path, dtype=np.uint8, mode='r')
+    except (OSError, ValueError):
+        return None
+    if len(buf) < HEADER_DTYPE.itemsize:
+        return None
+
+    header = buf[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+    if header['magic'] != CACHE_MAGIC or header['version'] != CACHE_VERSION:
+        return None
+    if source_stat is not None and \
+       (header['source_size'] != source_stat.st_size or header['source_mtime_ns'] != source_stat.st_mtime_ns):
+        return None
+
+    num_blocks  = int(header['num_blocks'])
+    num_lines   = int(header['num_lines'])
+    num_strings = int(header['num_strings'])
+    num_points  = int(header['num_points'])
+
+    sizes = [16*num_blocks, 16*num_lines, 16*num_strings,
+             4*(num_blocks+1), 4*(num_lines+1), 4*(num_strings+1),
+             4*(num_blocks+1), 8*num_points,
+             int(header['settings_bytes']), int(header['content_bytes'])]
+    if len(buf) < _aligned(HEADER_DTYPE.itemsize) + sum(map(_aligned, sizes[:-1])) + sizes[-1]:
+        # Truncated file
+        return None
+
+    offset = _aligned(HEADER_DTYPE.itemsize)
+    def take(nbytes):
+        nonlocal offset
+        section = buf[offset:offset+nbytes]
+        offset  = _aligned(offset + nbytes)
+        return section
+
+    blocks          = take(sizes[0]).view('<i4').reshape(-1, 4)
+    lines           = take(sizes[1]).view('<i4').reshape(-1, 4)
+    strings         = take(sizes[2]).view('<i4').reshape(-1, 4)
+    block_lines     = take(sizes[3]).view('<i4')
+    line_strings    = take(sizes[4]).view('<i4')
+    content_offsets = take(sizes[5]).view('<i4')
+    polygon_offsets = take(sizes[6]).view('<i4')
+    polygon_points  = take(sizes[7]).view('<i4').reshape(-1, 2)
+    settings        = take(sizes[8]).tobytes().decode('utf-8')
+    content         = take(sizes[9]).tobytes().decode('utf-8')
+
+    width  = None if header['width'] == _MISSING else int(header['width'])
+    height = None if header['height'] == _MISSING else int(header['height'])
+    return ParsedAltoPage(width, height, settings, blocks, lines, strings,
+                          block_lines, line_strings, content, content_offsets,
+                          polygon_offsets, polygon_points)
+
+
+
+"""read_alto_cached
+
+Drop-in replacement of alto.read_alto backed by an on-disk cache. The xml
+file is only parsed when its cache is missing or older than the file.
+
+Args:
+    xml_file_path (str): Path to the ALTO xml file
+    cache_dir (str): Path to the cache directory (None: no caching)
+
+Returns:
+    page (ParsedAltoPage): Parsed page
+"""
+def read_alto_cached(xml_file_path, cache_dir=None):
+    if cache_dir is None:
+        return read_alto(xml_file_path)
+
+    source_stat = os.stat(xml_file_path)
+    path = cache_path(cache_dir, xml_file_path)
+    page = load_page(path, source_stat)
+    if page is None:
+        page = read_alto(xml_file_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        save_page(path, page, source_stat)
+    return page
+
+
+
+def _arrays(page):
+    return (page.blocks, page.lines, page.strings,
+            page.block_lines, page.line_strings, page.content_offsets,
+            page.polygon_offsets, page.polygon_points)
+
+
+
+def _aligned(offset):
+    return offset + (-offset % 8)
@@ -0,0 +1,118 @@
+import os
+
+
+
+ZONE_SUFFIX = '_dhSegment'
+
+
+
+"""scan_xml_files
+
+Walks a directory tree once with os.scandir.
+
+Args:
+    root (str): Path to the root directory
+
+Yields:
+    path (str): Path to each xml file under root
+"""
+def scan_xml_files(root):
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=True):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith('.xml'):
+                    yield entry.path
+
+
+
+"""page_key
+
+Args:
+    xml_file_path (str): Path to a zone or OCR xml file
+
+Returns:
+    key (str): Basename without extension and without the '_dhSegment' suffix
+               added by run_segmentation.py
+"""
+def page_key(xml_file_path):
+    key = os.path.basename(xml_file_path).split('.')[0]
+    if key.endswith(ZONE_SUFFIX):
+        key = key[:-len(ZONE_SUFFIX)]
+    return key
+
+
+
+"""pair_xml_files
+
+Args:
+    zone_xml_path (str): Path to the root directory of Zone xml files
+    ocr_xml_path (str): Path to the root directory of OCR xml files
+
+Returns:
+    pairs (list of (str, str)): (zone_xml_file_path, ocr_xml_file_path) sorted by page key
+    zone_orphans (list of str): Zone xml files without an OCR counterpart (or sharing a key)
+    ocr_orphans (list of str): OCR xml files without a zone counterpart (or sharing a key)
+"""
+def pair_xml_files(zone_xml_path, ocr_xml_path):
+    zone_orphans, ocr_orphans = [], []
+
+    zone_by_key = {}
+    for zone_xml_file_path in scan_xml_files(zone_xml_path):
+        key = page_key(zone_xml_file_path)
+        if key in zone_by_key:
+            zone_orphans.append(zone_xml_file_path)
+        else:
+            zone_by_key[key] = zone_xml_file_path
+
+    pairs_by_key = {}
+    for ocr_xml_file_path in scan_xml_files(ocr_xml_path):
+        key = page_key(ocr_xml_file_path)
+        if key in pairs_by_key or key not in zone_by_key:
+            ocr_orphans.append(ocr_xml_file_path)
+        else:
+            pairs_by_key[key] = (zone_by_key[key], ocr_xml_file_path)
+
+    zone_orphans += [path for key, path in zone_by_key.items() if key not in pairs_by_key]
+
+    pairs = [pairs_by_key[key] for key in sorted(pairs_by_key)]
+    return pairs, sorted(zone_orphans), sorted(ocr_orphans)
+
+
+
+"""read_pair_list
+
+Args:
+    pair_list_path (str): Path to a text file with one 'zone_xml_file_path<TAB>ocr_xml_file_path'
+                          per line (blank lines and lines starting with '#' are ignored)
+
+Returns:
+    pairs (list of (str, str)): (zone_xml_file_path, ocr_xml_file_path)
+"""
+def read_pair_list(pair_list_path):
+    pairs = []
+    with open(pair_list_path) as pair_list_fp:
+        for line_no, line in enumerate(pair_list_fp, 1):
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            fields = line.split('\t')
+            if len(fields) != 2:
+                raise ValueError("{}:{}: expected 'zone_xml<TAB>ocr_xml'".format(pair_list_path, line_no))
+            pairs.append((fields[0], fields[1]))
+    return pairs
+
+
+
+"""write_pair_list
+
+Args:
+    pair_list_path (str): Path to the pair list file to write
+    pairs (list of (str, str)): (zone_xml_file_path, ocr_xml_file_path)
+"""
+def write_pair_list(pair_list_path, pairs):
+    with open(pair_list_path, 'w') as pair_list_fp:
+        for zone_xml_file_path, ocr_xml_file_path in pairs:
+            pair_list_fp.write("{}\t{}\n".format(zone_xml_file_path, ocr_xml_file_path))
@@ -4,17 +4,19 @@ import cv2
 from glob import glob
 import numpy as np
 import random
-import tensorflow as tf
 from imageio import imread, imsave
-import tensorflow.contrib.slim as slim
 
 from datetime import datetime
 from tqdm import tqdm
+from queue import Queue
+from threading import Thread
 
 from dh_segment.io import PAGE
-from dh_segment.inference import LoadedModel
+from dh_segment.inference import LoadedModel, InferenceClient
 from dh_segment.post_processing import boxes_detection, binarization
 
+from image_header import image_size, read_reduced
+
 import xml.etree.ElementTree as ET
 import argparse
 
@@ -30,6 +32,36 @@ parser.add_argument('-s', '--savepath', type=str, required=True,
 parser.add_argument('-t', '--threshold', type=int, default=0.005,
                    help='a threshold for ignoring small zones [0,1] (default: 0.005)')
 
+parser.add_argument('-p', '--polygon', action='store_true',
+                   help='also store the outline of each zone as a polygon (<Coords points="x,y ...">) inside its TextBlock')
+
+parser.add_argument('--inputsize', type=int, default=720000,
+                   help='number of pixels the model resizes its input to; JPEGs are decoded at the coarsest scale (1/2, 1/4, 1/8) still above it (0: the model decodes the full image) (default: 720000)')
+
+parser.add_argument('--server', type=str, default=None,
+                   help='address of a running inference server (http://host:port or a unix socket path) to use instead of loading the model')
+
+parser.add_argument('--gpu', type=str, default='0',
+                   help='GPU(s) visible to the model, as CUDA_VISIBLE_DEVICES (empty string: CPU only) (default: 0)')
+
+parser.add_argument('--intraop', type=int, default=0,
+                   help='number of threads the model uses inside an operation (0: one per available CPU) (default: 0)')
+
+parser.add_argument('--interop', type=int, default=0,
+                   help='number of operations the model runs in parallel (0: one per available CPU) (default: 0)')
+
+parser.add_argument('--cpus', type=str, default=None,
+                   help='pin the process to these CPUs, e.g. 0-15 or 0,2,4 (default: all)')
+
+parser.add_argument('--readers', type=int, default=2,
+                   help='number of threads loading images ahead of the model (default: 2)')
+
+parser.add_argument('--postprocessors', type=int, default=2,
+                   help='number of threads extracting zones from the predictions (default: 2)')
+
+parser.add_argument('--queuedepth', type=int, default=4,
+                   help='maximum number of images waiting between two stages (default: 4)')
+
 args = parser.parse_args()
 
 
@@ -38,9 +70,16 @@ IMAGE_DIR = args.imagepath
 SAVE_DIR  = args.savepath
 CONNECTIVITY  = 4
 SM_ZONE_RATIO = args.threshold
+POLYGON       = args.polygon
+POLYGON_EPSILON = 2   # max. outline simplification error in predicted pixels
+INPUT_SIZE    = args.inputsize
+SERVER        = args.server
+NUM_READERS        = max(1, args.readers)
+NUM_POSTPROCESSORS = max(1, args.postprocessors)
+QUEUE_DEPTH        = max(1, args.queuedepth)
 LOG_DIR = './log'
 log_filename = datetime.now().strftime('dhSegment_%H_%M_%d_%m_%Y.log')
-os.environ["CUDA_VISIBLE_DEVICES"]="0"
+os.environ["CUDA_VISIBLE_DEVICES"]=args.gpu
 
 
 BG_ID     = 0
@@ -59,140 +98,237 @@ except FileExistsError:
     pass
 
 
-"""Start session"""
-session = tf.InteractiveSession()
+if SERVER is not None:
+    # Use the model of the inference server, which decodes the images itself (and rejects another input size)
+    m = InferenceClient(SERVER, resized_size=INPUT_SIZE if INPUT_SIZE > 0 else None)
+else:
+    """Load model (in its own session)"""
+    model_dir = './dhSegment/pretrained_models/ENP_500_model_v3/export/1564890842/'
+    m = LoadedModel(model_dir, predict_mode='image' if INPUT_SIZE > 0 else 'filename',
+                    intra_op_threads=args.intraop, inter_op_threads=args.interop, cpus=args.cpus)
 
-"""Load model"""
-model_dir = './dhSegment/pretrained_models/ENP_500_model_v3/export/1564890842/'
-m = LoadedModel(model_dir, predict_mode='filename')
 
 
 """
-1. Preparation 
-
-Input batch
+Pipeline stages
+
+Every image travels as a dict through
+    readers (threads) -> inference (main thread) -> post-processors (threads) -> writer (thread)
+connected by bounded queues, so a stage blocks once QUEUE_DEPTH images wait for
+the next one (back-pressure) and reading, post-processing and writing overlap
+with the model. A stage that fails on an image stores the error in the dict,
+later stages skip it and the writer logs it.
 """
-image_list = glob(os.path.join(IMAGE_DIR,'**/*.jpg'),recursive=True)
+def load_image(item):
+    # Parse filename
+    basename   = os.path.basename(item['input_path'])
+    basename_wo_ext = os.path.splitext(basename)[0]
+    item['log'].append("input_path\t\t: {}\n".format(item['input_path']))
+    item['log'].append("basename\t\t: {}\n".format(basename))
+    item['log'].append("basename (w/o ext)\t: {}\n".format(basename_wo_ext))
 
-with open(os.path.join(LOG_DIR,log_filename),'w') as fl:
-    fl.write("{} file(s) are found under:\n{}\n".format(len(image_list),IMAGE_DIR))
+    item['basename_wo_ext'] = basename_wo_ext
+
+    # Read image size from the file header
+    oriH,oriW = image_size(item['input_path'])
+    item['shape'] = (oriH,oriW)
+    if INPUT_SIZE <= 0 or SERVER is not None:
+        # The model decodes the image itself
+        return
+
+    # Decode at the coarsest scale the model still downsizes from
+    item['image'], factor = read_reduced(item['input_path'], INPUT_SIZE)
+    item['log'].append("decoded at 1/{}\t\t: {}x{}\n".format(factor, item['image'].shape[1], item['image'].shape[0]))
 
-    for _idx,input_path in enumerate(tqdm(image_list)):    
-        try:
 
-            fl.write("\n***[{}/{}]***\n".format(_idx+1,len(image_list)))
 
-            # Create the file structure
-            data_PcGts = ET.Element('PcGts')
-            data_PcGts.set('xmlns','http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15')
-            data_PcGts.set('xmlns:xsi','http://www.w3.org/2001/XMLSchema-instance')
-            data_PcGts.set('xsi:schemaLocation','http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15 http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15/pagecontent.xsd')
-            data_meta = ET.SubElement(data_PcGts, 'Metadata')
-            data_page = ET.SubElement(data_PcGts,'Page')
+def predict(item):
+    """
+    2. Main
 
-            # Read image
-            img = cv2.imread(input_path)
+    Run prediction
+    """
+    # Run prediction
+    prediction_outputs = m.predict(item.pop('image') if 'image' in item else item['input_path'])
+    item['pred_labels'] = np.copy(prediction_outputs['labels'][0]).astype(np.uint8)
 
-            # Parse filename
-            basename   = os.path.basename(input_path)
-            basename_wo_ext = os.path.splitext(basename)[0]
-            fl.write("input_path\t\t: {}\n".format(input_path))
-            fl.write("basename\t\t: {}\n".format(basename))
-            fl.write("basename (w/o ext)\t: {}\n".format(basename_wo_ext))
 
 
+def extract_zones(item):
+    pred_labels = item.pop('pred_labels')
 
-            """
-            2. Main
+    # Create the file structure
+    data_PcGts = ET.Element('PcGts')
+    data_PcGts.set('xmlns','http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15')
+    data_PcGts.set('xmlns:xsi','http://www.w3.org/2001/XMLSchema-instance')
+    data_PcGts.set('xsi:schemaLocation','http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15 http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15/pagecontent.xsd')
+    data_meta = ET.SubElement(data_PcGts, 'Metadata')
+    data_page = ET.SubElement(data_PcGts,'Page')
 
-            Run prediction
-            """
-            # Run prediction
-            prediction_outputs = m.predict(input_path)
-            pred_labels = np.copy(prediction_outputs['labels'][0]).astype(np.uint8)
 
 
+    """
+    2. Main
 
-            """
-            2. Main
+    Get basic attributes
+    """
+    oriH,oriW = item['shape']
+    newH,newW = np.shape(pred_labels)
 
-            Get basic attributes
-            """
-            oriH,oriW = np.shape(img)[:2]
-            newH,newW = np.shape(pred_labels)
+    data_page.set("HEIGHT",str(oriH))
+    data_page.set("WIDTH",str(oriW))
 
-            data_page.set("HEIGHT",str(oriH))
-            data_page.set("WIDTH",str(oriW))
 
 
+    """
+    3. Postprocessing
 
-            """
-            3. Postprocessing
+    Generate binary mask for each class
+    """
+    mask_texts   = np.copy(pred_labels)
+    mask_texts[mask_texts != TEXT_ID] = 0
 
-            Generate binary mask for each class
-            """
-            mask_texts   = np.copy(pred_labels)
-            mask_texts[mask_texts != TEXT_ID] = 0
 
 
+    """
+    3. Postprocessing
 
-            """
-            3. Postprocessing
+    Generate polygones for each class
+    """
+    txt_num_labels, txt_labels, txt_stats, txt_centroids = cv2.connectedComponentsWithStats(mask_texts, CONNECTIVITY, cv2.CV_32S)
 
-            Generate polygones for each class
-            """
-            txt_num_labels, txt_labels, txt_stats, txt_centroids = cv2.connectedComponentsWithStats(mask_texts, CONNECTIVITY, cv2.CV_32S)
 
 
+    """
+    4. Postprocessing (TextRegion; Rectangle)
 
-            """
-            4. Postprocessing (TextRegion; Rectangle)
+    """
+    factor_h = oriH/newH
+    factor_w = oriW/newW
 
-            """
-            factor_h = oriH/newH
-            factor_w = oriW/newW
+    # Get rectangle region
+    cnt_remove = 0
+    THRESHOLD_SM_ZONE = (newH*newW)*SM_ZONE_RATIO
+    region_idx = 0
+    for bb_idx in range(1,txt_num_labels):
+        if txt_stats[bb_idx][4] < THRESHOLD_SM_ZONE:
+            cnt_remove+=1
+            continue
+        # Resize predicted coordinate
+        left,top,width,height   = txt_stats[bb_idx][:4]
+        pred_left,pred_top      = left,top
+        pred_width,pred_height  = width,height
 
-            # Get rectangle region
-            cnt_remove = 0
-            THRESHOLD_SM_ZONE = (newH*newW)*SM_ZONE_RATIO
-            region_idx = 0
-            for bb_idx in range(1,txt_num_labels):
-                if txt_stats[bb_idx][4] < THRESHOLD_SM_ZONE:
-                    cnt_remove+=1
-                    continue
-                # Resize predicted coordinate
-                left,top,width,height   = txt_stats[bb_idx][:4]
+        left   = int(left*factor_w)
+        width  = int(width*factor_w)
+        top    = int(top*factor_h)
+        height = int(height*factor_h)
 
-                left   = int(left*factor_w)
-                width  = int(width*factor_w)
-                top    = int(top*factor_h)
-                height = int(height*factor_h)
+        p1 = (left,top)
+        p2 = (left+width,top+height)
 
-                p1 = (left,top)
-                p2 = (left+width,top+height)
+        region_idx +=1
 
-                region_idx +=1
+        # Inject coordinates
+        data_textBlock = ET.SubElement(data_page, 'TextBlock')
+        data_textBlock.set("ID",str(region_idx))
+        data_textBlock.set("HEIGHT",str(height))
+        data_textBlock.set("WIDTH",str(width))
+        data_textBlock.set("HPOS",str(left))
+        data_textBlock.set("VPOS",str(top))
 
-                # Inject coordinates
-                data_textBlock = ET.SubElement(data_page, 'TextBlock')
-                data_textBlock.set("ID",str(region_idx))
-                data_textBlock.set("HEIGHT",str(height))
-                data_textBlock.set("WIDTH",str(width))
-                data_textBlock.set("HPOS",str(left))
-                data_textBlock.set("VPOS",str(top))
+        # Inject polygon (outer contour of the connected component)
+        if POLYGON:
+            component = (txt_labels[pred_top:pred_top+pred_height, pred_left:pred_left+pred_width] == bb_idx).astype(np.uint8)
+            contours  = cv2.findContours(component, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+            contour   = cv2.approxPolyDP(max(contours, key=cv2.contourArea), POLYGON_EPSILON, True)[:,0]
+            if len(contour) >= 3:
+                points = ["{},{}".format(int((x+pred_left)*factor_w), int((y+pred_top)*factor_h)) for x,y in contour]
+                data_coords = ET.SubElement(data_textBlock, 'Coords')
+                data_coords.set("points"," ".join(points))
 
-            # Finalize file structure in xml format
-            data_page_xml = ET.tostring(data_PcGts)
+    # Finalize file structure in xml format
+    item['xml'] = ET.tostring(data_PcGts)
+    item['log'].append("Total {} textRegion(s) are found.\n...{} region(s) are removed from the original finding.\n".format(txt_num_labels-cnt_remove,cnt_remove))
 
-            # Save xml
-            save_xml_filename = basename_wo_ext + '_dhSegment' + '.xml'
-            with open(os.path.join(SAVE_DIR, save_xml_filename), "wb") as data_page_xml_file:
-                data_page_xml_file.write(data_page_xml)
 
-            fl.write("Total {} textRegion(s) are found.\n...{} region(s) are removed from the original finding.\n".format(txt_num_labels-cnt_remove,cnt_remove))
+
+def save_xml(item):
+    # Save xml
+    save_xml_filename = item['basename_wo_ext'] + '_dhSegment' + '.xml'
+    with open(os.path.join(SAVE_DIR, save_xml_filename), "wb") as data_page_xml_file:
+        data_page_xml_file.write(item.pop('xml'))
+
+
+
+def run_stage(stage_fn, item):
+    if item.get('error') is None:
+        try:
+            stage_fn(item)
         except Exception as e:
-            fl.write("unexpected error occurred:\n{}".format(e))
-            pass
+            item['error'] = e
+    return item
+
+
+
+"""stage_worker
+
+Args:
+    stage_fn (function): Stage applied to every item
+    in_queue (Queue): Items to process (None: end of input)
+    out_queue (Queue): Processed items
+"""
+def stage_worker(stage_fn, in_queue, out_queue):
+    while True:
+        item = in_queue.get()
+        if item is None:
+            break
+        out_queue.put(run_stage(stage_fn, item))
 
 
 
+"""
+1. Preparation
+
+Input batch
+"""
+image_list = glob(os.path.join(IMAGE_DIR,'**/*.jpg'),recursive=True)
+
+with open(os.path.join(LOG_DIR,log_filename),'w') as fl:
+    fl.write("{} file(s) are found under:\n{}\n".format(len(image_list),IMAGE_DIR))
+
+    path_queue    = Queue()
+    decoded_queue = Queue(maxsize=QUEUE_DEPTH)
+    predict_queue = Queue(maxsize=QUEUE_DEPTH)
+    write_queue   = Queue(maxsize=QUEUE_DEPTH)
+
+    for _idx,input_path in enumerate(image_list):
+        path_queue.put({'idx': _idx, 'input_path': input_path, 'log': [], 'error': None})
+    for _ in range(NUM_READERS):
+        path_queue.put(None)
+
+    def write_results():
+        with tqdm(total=len(image_list)) as pbar:
+            for _ in range(len(image_list)):
+                item = run_stage(save_xml, write_queue.get())
+                fl.write("\n***[{}/{}]***\n".format(item['idx']+1,len(image_list)))
+                fl.write(''.join(item['log']))
+                if item['error'] is not None:
+                    fl.write("unexpected error occurred:\n{}".format(item['error']))
+                pbar.update(1)
+
+    readers  = [Thread(target=stage_worker, args=(load_image, path_queue, decoded_queue), daemon=True)
+                for _ in range(NUM_READERS)]
+    postprocessors = [Thread(target=stage_worker, args=(extract_zones, predict_queue, write_queue), daemon=True)
+                      for _ in range(NUM_POSTPROCESSORS)]
+    writer   = Thread(target=write_results, daemon=True)
+    for thread in readers + postprocessors + [writer]:
+        thread.start()
+
+    # Single inference stage, the model is only called from this thread
+    for _ in range(len(image_list)):
+        predict_queue.put(run_stage(predict, decoded_queue.get()))
+
+    for _ in range(NUM_POSTPROCESSORS):
+        predict_queue.put(None)
+    writer.join()
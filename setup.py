@@ -15,4 +15,15 @@ setup(name='zone2ocr',
         'jupyter',
         'matplotlib'
       ],
+      extras_require={
+          'fast': [
+              'orjson'
+          ],
+          'zstd': [
+              'zstandard'
+          ],
+          'parquet': [
+              'pyarrow'
+          ],
+      },
       zip_safe=False)
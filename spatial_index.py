@@ -0,0 +1,130 @@
+import numpy as np
+
+
+
+"""BlockIndex
+
+Sorted interval index over axis-aligned boxes. Boxes are sorted once by their
+left edge, so a query only scans the boxes that start before the right edge of
+the query box instead of every box on the page.
+
+Args:
+    boxes (list of (x0, y0, x1, y1)): Boxes to index (e.g., scaled OCR textblocks)
+"""
+class BlockIndex(object):
+    def __init__(self, boxes):
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+
+        self.size  = len(boxes)
+        self.order = np.argsort(boxes[:, 0], kind='stable')
+        self.x0    = boxes[self.order, 0]
+        self.y0    = boxes[self.order, 1]
+        self.x1    = boxes[self.order, 2]
+        self.y1    = boxes[self.order, 3]
+
+    def __len__(self):
+        return self.size
+
+    """query
+
+    Args:
+        box ((x0, y0, x1, y1)): Query box
+        touching (bool):
+            True: Also return boxes that only share an edge or a corner with the query box
+            False: Return boxes that overlap the query box with a non-zero area
+
+    Returns:
+        indices (np.ndarray): Indices (in insertion order) of the candidate boxes
+    """
+    def query(self, box, touching=False):
+        x0, y0, x1, y1 = box
+        if touching:
+            stop = np.searchsorted(self.x0, x1, side='right')
+            hits = (self.x1[:stop] >= x0) & (self.y0[:stop] <= y1) & (self.y1[:stop] >= y0)
+        else:
+            stop = np.searchsorted(self.x0, x1, side='left')
+            hits = (self.x1[:stop] > x0) & (self.y0[:stop] < y1) & (self.y1[:stop] > y0)
+
+        return np.sort(self.order[:stop][hits])
+
+
+
+"""GridIndex
+
+Uniform grid (bucket) index over axis-aligned boxes, suited to many small
+boxes such as the words of a page. Every box is registered in each cell it
+covers, with the cells stored in CSR form (sorted cell keys and item
+offsets), so a query only visits the cells under the query box.
+
+Args:
+    boxes (list of (x0, y0, x1, y1)): Boxes to index (e.g., scaled OCR strings)
+    cell_size (int): (Optional) Cell edge length; by default four times the
+                     median box extent
+"""
+class GridIndex(object):
+    def __init__(self, boxes, cell_size=None):
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        self.boxes = boxes
+        self.size  = len(boxes)
+
+        if cell_size is None:
+            extent    = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]) if self.size else [1]
+            cell_size = max(1, int(np.median(extent)) * 4)
+        self.cell_size = cell_size
+
+        cx0, cy0 = boxes[:, 0] // cell_size, boxes[:, 1] // cell_size
+        cx1, cy1 = boxes[:, 2] // cell_size, boxes[:, 3] // cell_size
+        self.gx0 = int(cx0.min()) if self.size else 0
+        self.gy0 = int(cy0.min()) if self.size else 0
+        self.gx1 = int(cx1.max()) if self.size else -1
+        self.gy1 = int(cy1.max()) if self.size else -1
+        self.ncols = self.gx1 - self.gx0 + 1
+
+        # One (cell, box) item per covered cell
+        span_w = cx1 - cx0 + 1
+        counts = span_w * (cy1 - cy0 + 1)
+        items  = np.repeat(np.arange(self.size), counts)
+        local  = np.arange(len(items)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx     = cx0[items] + local % span_w[items]
+        cy     = cy0[items] + local // span_w[items]
+        keys   = (cy - self.gy0) * self.ncols + (cx - self.gx0)
+
+        order = np.argsort(keys, kind='stable')
+        self.items = items[order]
+        self.cell_keys, cell_starts = np.unique(keys[order], return_index=True)
+        self.cell_starts = np.append(cell_starts, len(self.items))
+
+    def __len__(self):
+        return self.size
+
+    """query
+
+    Args:
+        box ((x0, y0, x1, y1)): Query box
+        touching (bool):
+            True: Also return boxes that only share an edge or a corner with the query box
+            False: Return boxes that overlap the query box with a non-zero area
+
+    Returns:
+        indices (np.ndarray): Sorted indices of the matching boxes
+    """
+    def query(self, box, touching=False):
+        x0, y0, x1, y1 = [int(v) for v in box]
+        qx0, qx1 = max(x0 // self.cell_size, self.gx0), min(x1 // self.cell_size, self.gx1)
+        qy0, qy1 = max(y0 // self.cell_size, self.gy0), min(y1 // self.cell_size, self.gy1)
+        if qx0 > qx1 or qy0 > qy1:
+            return np.zeros(0, dtype=np.int64)
+
+        # Cells of a grid row are contiguous keys
+        row_keys = (np.arange(qy0, qy1+1) - self.gy0) * self.ncols
+        lo = np.searchsorted(self.cell_keys, row_keys + (qx0 - self.gx0), side='left')
+        hi = np.searchsorted(self.cell_keys, row_keys + (qx1 - self.gx0), side='right')
+        candidates = np.unique(np.concatenate([self.items[self.cell_starts[start]:self.cell_starts[stop]]
+                                               for start, stop in zip(lo, hi)]))
+
+        boxes = self.boxes[candidates]
+        if touching:
+            hits = (boxes[:, 0] <= x1) & (boxes[:, 2] >= x0) & (boxes[:, 1] <= y1) & (boxes[:, 3] >= y0)
+        else:
+            hits = (boxes[:, 0] < x1) & (boxes[:, 2] > x0) & (boxes[:, 1] < y1) & (boxes[:, 3] > y0)
+        return candidates[hits]
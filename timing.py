@@ -0,0 +1,131 @@
+import json
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+
+# Pipeline stages in report order
+STAGES = ['parse_zone', 'parse_ocr', 'text', 'index', 'match', 'serialize']
+
+
+
+# No-op context manager (contextlib.nullcontext is Python 3.7+)
+class _NoTimer(object):
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return None
+
+# Shared no-op context returned by stage() when timing is disabled
+_NO_TIMER = _NoTimer()
+
+
+
+"""StageTimer
+
+Accumulates the wall time spent in each stage of a single page.
+
+Usage:
+    timer = StageTimer()
+    with timer.stage('parse_ocr'):
+        ...
+    timer.timings  # {'parse_ocr': seconds}
+"""
+class StageTimer(object):
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+
+
+"""stage
+
+Args:
+    timer (StageTimer): Timer of the current page, or None when timing is disabled
+    name (str): Stage name (one of STAGES)
+
+Returns:
+    context manager timing the enclosed block (a shared no-op if timer is None)
+"""
+def stage(timer, name):
+    if timer is None:
+        return _NO_TIMER
+    return timer.stage(name)
+
+
+
+"""TimingReport
+
+Collects the per-stage timings of every page, optionally appending one JSON
+line per page ({"page_id": ..., "parse_zone": seconds, ..., "total": seconds})
+to a trace file, and summarizes them at the end of a run.
+
+Args:
+    trace_path (str): (Optional) Path to the JSON-lines trace file
+"""
+class TimingReport(object):
+    def __init__(self, trace_path=None):
+        self.pages    = []
+        self.start    = time.perf_counter()
+        self.trace_fp = open(trace_path, 'a') if trace_path is not None else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    """add
+
+    Args:
+        page_id (str): Page identifier
+        timings (dict): Stage name -> seconds (e.g., StageTimer.timings)
+    """
+    def add(self, page_id, timings):
+        self.pages.append(timings)
+        if self.trace_fp is not None:
+            record = {'page_id': page_id}
+            record.update(timings)
+            record['total'] = sum(timings.values())
+            self.trace_fp.write(json.dumps(record) + '\n')
+
+    """summary
+
+    Returns:
+        lines (list of str): p50/p95/max per stage in milliseconds and the page throughput
+    """
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        throughput = "{} page(s) in {:.1f} s ({:.2f} pages/s)".format(
+            len(self.pages), elapsed, len(self.pages) / elapsed if elapsed > 0 else 0.0)
+        if not self.pages:
+            return [throughput]
+
+        stages  = [name for name in STAGES if any(name in timings for timings in self.pages)]
+        stages += sorted(set(name for timings in self.pages for name in timings) - set(STAGES))
+
+        lines = ["{:<12} {:>10} {:>10} {:>10}".format('stage (ms)', 'p50', 'p95', 'max')]
+        for name in stages + ['total']:
+            if name == 'total':
+                values = [sum(timings.values()) for timings in self.pages]
+            else:
+                values = [timings.get(name, 0.0) for timings in self.pages]
+            p50, p95, p_max = np.percentile(np.asarray(values) * 1000, [50, 95, 100])
+            lines.append("{:<12} {:>10.2f} {:>10.2f} {:>10.2f}".format(name, p50, p95, p_max))
+        lines.append(throughput)
+        return lines
+
+    def close(self):
+        if self.trace_fp is not None:
+            self.trace_fp.close()
+            self.trace_fp = None
@@ -0,0 +1,418 @@
+import os
+import re
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+
+"""dumps
+
+Args:
+    obj (json object): Object to serialize
+
+Returns:
+    data (bytes): UTF-8 JSON, serialized with orjson when it is installed
+"""
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+
+"""write_json
+
+Streams a mapped page to a file one zone record at a time, so the page is
+serialized exactly once and never exists as one big string.
+
+Args:
+    out_json_path (str): Path to the output JSON file
+    map_json (list): Returned object from mapping
+"""
+def write_json(out_json_path, map_json):
+    separator = b',' if orjson is not None else b', '
+    with open(out_json_path, 'wb') as out_json_fp:
+        out_json_fp.write(b'[')
+        for record_idx, record in enumerate(map_json):
+            if record_idx > 0:
+                out_json_fp.write(separator)
+            out_json_fp.write(dumps(record))
+        out_json_fp.write(b']')
+
+
+
+"""JsonWriter
+
+Writes one JSON file per page, named after the page id.
+
+Args:
+    save_path (str): Path to save directory
+"""
+class JsonWriter(object):
+    def __init__(self, save_path):
+        self.save_path = save_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    """write
+
+    Args:
+        page_id (str): Page identifier (e.g., OCR xml basename without extension)
+        map_json (list): Returned object from mapping
+
+    Returns:
+        out_json_path (str): Path to the stored JSON file
+    """
+    def write(self, page_id, map_json):
+        out_json_path = os.path.join(self.save_path, page_id + '.json')
+        write_json(out_json_path, map_json)
+        return out_json_path
+
+    def close(self):
+        pass
+
+
+
+SHARD_EXTENSIONS = {
+    None: '.ndjson',
+    'gzip': '.ndjson.gz',
+    'zstd': '.ndjson.zst',
+}
+
+INDEX_FILENAME = 'pages.index.tsv'
+
+PARQUET_DIRNAME = 'parquet'
+
+
+
+"""NdjsonShardWriter
+
+Appends one {"page_id": ..., "zones": [...]} record per line to size-bounded
+NDJSON shards (pages-00000.ndjson, pages-00001.ndjson, ...). Compressed
+shards hold one gzip member / zstd frame per record, so every record can be
+decompressed on its own. A sidecar index (pages.index.tsv) maps each page id
+to its shard, byte offset and length, so read_page needs a single seek.
+
+Args:
+    save_path (str): Path to save directory
+    max_shard_bytes (int): A new shard is started once a shard would exceed this size
+    compression (str): None, 'gzip' or 'zstd'
+"""
+class NdjsonShardWriter(object):
+    def __init__(self, save_path, max_shard_bytes=256*1024*1024, compression=None):
+        if compression not in SHARD_EXTENSIONS:
+            raise ValueError("Unknown compression {}".format(compression))
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstd compression requires the zstandard package")
+
+        self.save_path       = save_path
+        self.max_shard_bytes = max_shard_bytes
+        self.compression     = compression
+        self._compressor     = zstandard.ZstdCompressor() if compression == 'zstd' else None
+
+        # Never append to shards of a previous (possibly interrupted) run
+        shard_pattern = re.compile(r'^pages-(\d+)\.ndjson')
+        existing = [int(m.group(1)) for m in map(shard_pattern.match, os.listdir(save_path)) if m]
+        self._shard_idx  = max(existing) + 1 if existing else 0
+        self._shard_fp   = None
+        self._shard_path = None
+        self._shard_size = 0
+
+        self._index_fp = open(os.path.join(save_path, INDEX_FILENAME), 'a')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _compress(self, data):
+        if self.compression == 'gzip':
+            return gzip.compress(data)
+        if self.compression == 'zstd':
+            return self._compressor.compress(data)
+        return data
+
+    def _open_shard(self):
+        if self._shard_fp is not None:
+            self._shard_fp.close()
+            self._shard_idx += 1
+        shard_name = 'pages-{:05d}{}'.format(self._shard_idx, SHARD_EXTENSIONS[self.compression])
+        self._shard_path = os.path.join(self.save_path, shard_name)
+        self._shard_fp   = open(self._shard_path, 'wb')
+        self._shard_size = 0
+
+    """write
+
+    Args:
+        page_id (str): Page identifier (e.g., OCR xml basename without extension)
+        map_json (list): Returned object from mapping
+
+    Returns:
+        shard_path (str): Path to the shard holding the page
+    """
+    def write(self, page_id, map_json):
+        data = self._compress(dumps({'page_id': page_id, 'zones': map_json}) + b'\n')
+
+        if self._shard_fp is None or \
+           (self._shard_size > 0 and self._shard_size + len(data) > self.max_shard_bytes):
+            self._open_shard()
+
+        offset = self._shard_size
+        self._shard_fp.write(data)
+        self._shard_fp.flush()
+        self._shard_size += len(data)
+
+        self._index_fp.write("{}\t{}\t{}\t{}\n".format(page_id, os.path.basename(self._shard_path), offset, len(data)))
+        self._index_fp.flush()
+        return self._shard_path
+
+    def close(self):
+        if self._shard_fp is not None:
+            self._shard_fp.close()
+            self._shard_fp = None
+        self._index_fp.close()
+
+
+
+"""load_index
+
+Args:
+    save_path (str): Path to save directory written by NdjsonShardWriter
+
+Returns:
+    index (dict): page_id -> (shard filename, byte offset, length); later entries win
+"""
+def load_index(save_path):
+    index = {}
+    with open(os.path.join(save_path, INDEX_FILENAME)) as index_fp:
+        for line in index_fp:
+            page_id, shard_name, offset, length = line.rstrip('\n').split('\t')
+            index[page_id] = (shard_name, int(offset), int(length))
+    return index
+
+
+
+"""read_page
+
+Args:
+    save_path (str): Path to save directory written by NdjsonShardWriter
+    page_id (str): Page identifier
+    index (dict): (Optional) Returned object from load_index, to avoid reloading it
+
+Returns:
+    map_json (list): Mapped zones of the page
+"""
+def read_page(save_path, page_id, index=None):
+    if index is None:
+        index = load_index(save_path)
+    shard_name, offset, length = index[page_id]
+
+    with open(os.path.join(save_path, shard_name), 'rb') as shard_fp:
+        shard_fp.seek(offset)
+        data = shard_fp.read(length)
+
+    if shard_name.endswith('.gz'):
+        data = gzip.decompress(data)
+    elif shard_name.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("reading zstd shards requires the zstandard package")
+        data = zstandard.ZstdDecompressor().decompress(data)
+
+    return json.loads(data)['zones']
+
+
+
+"""ParquetWriter
+
+Columnar export of mapped pages with one row per (page, zone, matched OCR
+textblock). Coordinates are int32 bounding boxes, the IoU is a float64
+column and page ids are dictionary encoded, so analytics jobs can query the
+results with predicate pushdown. Zones without any matched textblock produce
+no row. Rows are buffered and flushed as row groups of
+parquet/zones-NNNNN.parquet, so the parquet/ directory only holds data files
+and can be read as a dataset. Every run that writes rows starts a new file,
+and a new file is started every max_file_pages pages (see checkpoint). Files
+are written under a hidden temporary name (ignored by dataset readers) and
+only renamed once complete, so an interrupted run never leaves a file
+without footer behind.
+
+Requires map_json built with mapping(..., with_iou=True).
+
+Args:
+    save_path (str): Path to save directory
+    row_group_size (int): Number of buffered rows per row group
+    compression (str): Parquet compression codec
+    max_file_pages (int): Number of pages per file
+"""
+class ParquetWriter(object):
+    INT_COLUMNS = ['zone_idx', 'zone_x0', 'zone_y0', 'zone_x1', 'zone_y1',
+                   'ocr_x0', 'ocr_y0', 'ocr_x1', 'ocr_y1']
+
+    def __init__(self, save_path, row_group_size=65536, compression='zstd', max_file_pages=1000):
+        # pyarrow is heavy to import, only load it when the parquet output is used
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("parquet output requires the pyarrow package")
+        self.pyarrow = pyarrow
+
+        self.row_group_size = row_group_size
+        self.schema = pyarrow.schema(
+            [('page_id', pyarrow.dictionary(pyarrow.int32(), pyarrow.string()))] +
+            [(name, pyarrow.int32()) for name in self.INT_COLUMNS] +
+            [('iou', pyarrow.float64()), ('zone_text', pyarrow.string()), ('ocr_text', pyarrow.string())])
+
+        self.compression = compression
+        self.max_file_pages = max_file_pages
+
+        self.parquet_path = os.path.join(save_path, PARQUET_DIRNAME)
+        os.makedirs(self.parquet_path, exist_ok=True)
+        file_pattern = re.compile(r'^zones-(\d+)\.parquet$')
+        existing = [int(m.group(1)) for m in map(file_pattern.match, os.listdir(self.parquet_path)) if m]
+        self._file_idx = max(existing) + 1 if existing else 0
+        self._set_file()
+        # A file is only created once there are rows to write
+        self._writer = None
+        self._num_pages = 0
+        self._reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _set_file(self):
+        file_name = 'zones-{:05d}.parquet'.format(self._file_idx)
+        self.path = os.path.join(self.parquet_path, file_name)
+        self._tmp_path = os.path.join(self.parquet_path, '.{}.tmp'.format(file_name))
+
+    def _close_file(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self._tmp_path, self.path)
+            self._file_idx += 1
+            self._set_file()
+        self._num_pages = 0
+
+    def _reset(self):
+        self._columns = {name: [] for name in self.schema.names}
+        self._num_rows = 0
+
+    def _flush(self):
+        if self._num_rows == 0:
+            return
+        pyarrow = self.pyarrow
+        page_ids = pyarrow.array(self._columns['page_id'], pyarrow.string()).dictionary_encode()
+        arrays = [page_ids.cast(self.schema.field('page_id').type)] + \
+                 [pyarrow.array(self._columns[name], field.type)
+                  for name, field in zip(self.schema.names[1:], list(self.schema)[1:])]
+        if self._writer is None:
+            self._writer = pyarrow.parquet.ParquetWriter(self._tmp_path, self.schema, compression=self.compression)
+        self._writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+        self._reset()
+
+    """write
+
+    Args:
+        page_id (str): Page identifier (e.g., OCR xml basename without extension)
+        map_json (list): Returned object from mapping(..., with_iou=True)
+
+    Returns:
+        path (str): Path the parquet file holding the page's rows will have once complete,
+                    or the parquet directory if the page has no row
+    """
+    def write(self, page_id, map_json):
+        columns = self._columns
+        num_rows = self._num_rows
+        for zone_idx, zone in enumerate(map_json):
+            zone_x0, zone_y0, zone_x1, zone_y1 = _bounds(zone['zone_coord'])
+            for ocr_coord, iou, zone_text, ocr_text in zip(zone['ocr_coords'], zone['ocr_ious'],
+                                                           zone['zone_texts'], zone['ocr_texts']):
+                ocr_x0, ocr_y0, ocr_x1, ocr_y1 = _bounds(ocr_coord)
+                columns['page_id'].append(page_id)
+                columns['zone_idx'].append(zone_idx)
+                columns['zone_x0'].append(zone_x0)
+                columns['zone_y0'].append(zone_y0)
+                columns['zone_x1'].append(zone_x1)
+                columns['zone_y1'].append(zone_y1)
+                columns['ocr_x0'].append(ocr_x0)
+                columns['ocr_y0'].append(ocr_y0)
+                columns['ocr_x1'].append(ocr_x1)
+                columns['ocr_y1'].append(ocr_y1)
+                columns['iou'].append(iou)
+                columns['zone_text'].append(zone_text)
+                columns['ocr_text'].append(ocr_text)
+                self._num_rows += 1
+        page_has_rows = self._num_rows > num_rows
+        self._num_pages += 1
+
+        if self._num_rows >= self.row_group_size:
+            self._flush()
+        return self.path if page_has_rows else self.parquet_path
+
+    """checkpoint
+
+    Completes the current file once it holds max_file_pages pages.
+
+    Returns:
+        (bool): True if every page written so far is in a complete file
+    """
+    def checkpoint(self):
+        if self._num_pages < self.max_file_pages:
+            return False
+        self._close_file()
+        return True
+
+    def close(self):
+        self._close_file()
+
+
+
+def _bounds(coords):
+    xs = [point[0] for point in coords]
+    ys = [point[1] for point in coords]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+
+WRITERS = {
+    'json': JsonWriter,
+    'ndjson': NdjsonShardWriter,
+    'parquet': ParquetWriter,
+}
+
+
+
+"""make_writer
+
+Args:
+    output_format (str): One of WRITERS
+    save_path (str): Path to save directory
+    **kwargs: Writer specific options
+
+Returns:
+    writer: Object with write(page_id, map_json) and close()
+"""
+def make_writer(output_format, save_path, **kwargs):
+    if output_format not in WRITERS:
+        raise ValueError("Unknown output format {} (expected one of {})".format(output_format, ', '.join(sorted(WRITERS))))
+    return WRITERS[output_format](save_path, **kwargs)
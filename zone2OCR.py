@@ -1,231 +1,491 @@
 import os, sys, errno
-import numpy as np
-import cv2
-from xml.dom import minidom
-import matplotlib.pyplot as plt
-from shapely.geometry import Polygon
 from tqdm import tqdm
-from glob import glob
+from collections import Counter, deque
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import traceback
 import argparse
-import json
 
+from alto import read_alto
+from page_cache import read_alto_cached
+from manifest import Manifest
+from pairing import page_key, pair_xml_files, read_pair_list, write_pair_list
+from writers import make_writer
+from mapper import mapping, mapping_sweep
+from timing import StageTimer, TimingReport, stage
+
+
+
+"""process_pair
+
+Args:
+    zone_xml_file_path (str): Path to Segmented output xml file
+    ocr_xml_file_path (str): Path to OCR xml file
+    iou_threshold (float or list of float): Threshold for intersection over union,
+        or a list of thresholds to map the page for all of them at once
+    DEBUG (bool):
+        True: Print details
+        False: Silent
+    with_iou (bool): Keep the IoU of each matched OCR textblock (needed by the parquet output)
+    cache_dir (str): (Optional) Directory of the parsed OCR page cache
+    timer (StageTimer): (Optional) Records the time spent in each stage
+    granularity (str): Build zone texts from OCR TextLines ('line') or Strings ('word')
+
+Returns:
+    map_json (json object): Final mapped result in JSON format
+        (a dict of iou_threshold -> map_json for a list of thresholds)
+"""
+def process_pair(zone_xml_file_path, ocr_xml_file_path, iou_threshold=0.1, DEBUG=False, with_iou=False, cache_dir=None, timer=None, granularity='line'):
+    """
+    Zone Processing
+    """
+    # Read Zone xml
+    with stage(timer, 'parse_zone'):
+        zone_page = read_alto(zone_xml_file_path)
+
+    # Get image dimension and resize factor
+    img_w  = zone_page.width
+    img_h  = zone_page.height
 
+    # Count number of text-blocks
+    zone_textBlocks = zone_page
 
-parser = argparse.ArgumentParser(description='Read OCR.xml that follows PAGE XML-schema (https://www.primaresearch.org/tools/PAGELibraries) and map zone-level coordinates to the corresponding OCR text contents')
-parser.add_argument('-zx', '--zonexmlpath', type=str, required=True,
-                   help='a path to the root directory of Zone xml files')
+    if DEBUG:
+        print("Zone XML:")
+        print("{} \tWidth (factored)".format(img_w))
+        print("{} \tHeight (factored)".format(img_h))
+        print("{} \tTextBlock(s)".format(len(zone_textBlocks)))
 
-parser.add_argument('-ox', '--ocrxmlpath', type=str, required=True,
-                   help='a path to the root directory of OCR xml files')
+    """
+    OCR Processing
+    """
+    # Read OCR xml (or its parsed copy from the cache)
+    with stage(timer, 'parse_ocr'):
+        ocr_page = read_alto_cached(ocr_xml_file_path, cache_dir)
 
-parser.add_argument('-t', '--iouthreshold', type=float, default=0.1,
-                   help='an IoU threshold ([0,1]) for mapping (default=0.1)')
+    # Get image dimension and resize factor
+    image_width  = ocr_page.width
+    image_height = ocr_page.height
 
-parser.add_argument('-s', '--savepath', type=str, required=True,
-                   help='a path to the root directory of save files')
+    factor = img_w/image_width
 
-parser.add_argument('-v', '--verbose',
-                    help='increase output verbosity',
-                    action='store_false')
+    # Count number of text-blocks
+    ocr_textBlocks = ocr_page
 
-args = parser.parse_args()
+    if DEBUG:
+        print("OCR XML:")
+        print("{} \tWidth (original)".format(image_width))
+        print("{} \tHeight (original)".format(image_height))
+        print("{} \tWidth (factored)".format(img_w))
+        print("{} \tHeight (factored)".format(img_h))
+        print("{} \tTextBlock(s)".format(len(ocr_textBlocks)))
 
 
 
+    """
+    MAPPING
+    """
+    if isinstance(iou_threshold, (list, tuple)):
+        return mapping_sweep(zone_textBlocks=zone_textBlocks,
+                             ocr_textBlocks=ocr_textBlocks,
+                             factor=factor,
+                             iou_thresholds=iou_threshold,
+                             progress=False,
+                             with_iou=with_iou,
+                             timer=timer,
+                             granularity=granularity)
+
+    map_json = mapping(zone_textBlocks=zone_textBlocks,
+                       ocr_textBlocks=ocr_textBlocks,
+                       factor=factor,
+                       usecase=2,
+                       iou_threshold=iou_threshold,
+                       progress=False,
+                       with_iou=with_iou,
+                       timer=timer,
+                       granularity=granularity)
+
+    return map_json
+
+
+
+"""_map_task
+
+Pool task wrapping process_pair. Errors are returned instead of raised so a
+single bad page does not abort the whole run.
+
+Args:
+    task (tuple): (idx, zone_xml_file_path, ocr_xml_file_path)
+    iou_threshold (float or list of float): Threshold(s) for intersection over union
+    with_iou (bool): Keep the IoU of each matched OCR textblock
+    cache_dir (str): (Optional) Directory of the parsed OCR page cache
+    profile (bool): Time the stages of the page
+    granularity (str): 'line' or 'word'
+
+Returns:
+    result (tuple): (idx, zone_xml_file_path, ocr_xml_file_path, map_json, error, worker pid,
+                     stage timings or None)
 """
-PARAMS
-"""
-ZONE_XML_PATH = args.zonexmlpath
-OCR_XML_PATH  = args.ocrxmlpath
-SAVE_PATH     = args.savepath
-IOU_THRESHOLD = args.iouthreshold
-DEBUG         = args.verbose
+def _map_task(task, iou_threshold=0.1, with_iou=False, cache_dir=None, profile=False, granularity='line'):
+    idx, zone_xml_file_path, ocr_xml_file_path = task
+    timer = StageTimer() if profile else None
+    try:
+        map_json = process_pair(zone_xml_file_path, ocr_xml_file_path, iou_threshold, with_iou=with_iou, cache_dir=cache_dir, timer=timer, granularity=granularity)
+        error = None
+    except Exception:
+        map_json, error = None, traceback.format_exc()
+    return (idx, zone_xml_file_path, ocr_xml_file_path, map_json, error, os.getpid(),
+            timer.timings if profile else None)
 
-if DEBUG:
-    print("ZONE_XML_PATH\t: {}".format(ZONE_XML_PATH))
-    print("OCR_XML_PATH\t: {}".format(OCR_XML_PATH))
-    print("SAVE_PATH\t: {}".format(SAVE_PATH))
 
 
+"""_map_chunk
 
+Args:
+    task_fn (function): _map_task with its options bound
+    chunk (list of tuple): Tasks handed to a worker at once
+
+Returns:
+    results (list of tuple): Returned objects from task_fn
 """
-Prepare Dirs
-"""
-try:
-    os.makedirs(SAVE_PATH)
-except FileExistsError:
-    # directory already exist
-    pass
+def _map_chunk(task_fn, chunk):
+    return [task_fn(task) for task in chunk]
 
 
 
-"""
-MAIN
-"""
-# Preparation
-zone_xml_file_paths = sorted(glob(os.path.join(ZONE_XML_PATH,'**/*.xml'),recursive=True))
-ocr_xml_file_paths  = sorted(glob(os.path.join(OCR_XML_PATH,'**/*.xml'),recursive=True))
+"""imap_pages
 
-for idx in tqdm(range(len(zone_xml_file_paths))):
-    zone_xml_file_path = zone_xml_file_paths[idx]
-    ocr_xml_file_path  = ocr_xml_file_paths[idx]
+Maps tasks in a process pool that survives workers dying hard (killed for
+memory, crash in the XML parser). The chunks in flight when the pool breaks
+cannot be told apart, so their pages are retried one at a time in a single
+worker at the end; a page that breaks the pool on its own is returned as
+failed instead of hanging or aborting the run.
 
-    print("[{}/{}] Processing \nzone xml: {}\nOCR xml: {}".format(idx+1,len(zone_xml_file_paths),zone_xml_file_path,ocr_xml_file_path))
-    
+Args:
+    task_fn (function): _map_task with its options bound
+    tasks (list of tuple): (idx, zone_xml_file_path, ocr_xml_file_path)
+    workers (int): Number of worker processes
+    chunksize (int): Number of tasks handed to a worker at once
+    ordered (bool): Yield results in task order (except retried pages)
 
+Yields:
+    result (tuple): Returned object from _map_task (pid is None for a page that killed its worker)
+"""
+def imap_pages(task_fn, tasks, workers, chunksize=8, ordered=True):
+    chunks = deque(tasks[i:i+chunksize] for i in range(0, len(tasks), chunksize))
+    lost   = []
+
+    executor = ProcessPoolExecutor(workers)
+    pending  = deque()
+    try:
+        while chunks or pending:
+            # Keep a bounded number of chunks in flight
+            while chunks and len(pending) < 2*workers:
+                chunk = chunks.popleft()
+                try:
+                    pending.append((executor.submit(_map_chunk, task_fn, chunk), chunk))
+                except BrokenProcessPool:
+                    lost.extend(chunk)
+
+            if ordered:
+                wait([pending[0][0]])
+            else:
+                wait([future for future, _ in pending], return_when=FIRST_COMPLETED)
+
+            broken = False
+            while pending and (pending[0][0].done() if ordered else any(future.done() for future, _ in pending)):
+                entry = pending[0] if ordered else next(entry for entry in pending if entry[0].done())
+                pending.remove(entry)
+                future, chunk = entry
+                try:
+                    results = future.result()
+                except BrokenProcessPool:
+                    lost.extend(chunk)
+                    broken = True
+                    continue
+                for result in results:
+                    yield result
+
+            if broken:
+                # Every chunk of the broken pool fails, restart with a fresh one
+                for _, chunk in pending:
+                    lost.extend(chunk)
+                pending.clear()
+                executor.shutdown(wait=True)
+                executor = ProcessPoolExecutor(workers)
+    finally:
+        executor.shutdown(wait=True)
+
+    # Retry the pages of broken pools in isolation to find the culprits
+    executor = None
+    try:
+        for task in lost:
+            if executor is None:
+                executor = ProcessPoolExecutor(1)
+            try:
+                results = executor.submit(_map_chunk, task_fn, [task]).result()
+            except BrokenProcessPool:
+                executor.shutdown(wait=True)
+                executor = None
+                idx, zone_xml_file_path, ocr_xml_file_path = task
+                yield (idx, zone_xml_file_path, ocr_xml_file_path, None,
+                       "Worker process died while mapping this page (e.g., killed for lack of memory)\n", None, None)
+                continue
+            for result in results:
+                yield result
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Read OCR.xml that follows PAGE XML-schema (https://www.primaresearch.org/tools/PAGELibraries) and map zone-level coordinates to the corresponding OCR text contents')
+    parser.add_argument('-zx', '--zonexmlpath', type=str,
+                       help='a path to the root directory of Zone xml files')
+
+    parser.add_argument('-ox', '--ocrxmlpath', type=str,
+                       help='a path to the root directory of OCR xml files')
+
+    parser.add_argument('-p', '--pairlist', type=str,
+                       help='a file listing "zone_xml<TAB>ocr_xml" pairs to map instead of walking -zx/-ox')
+
+    parser.add_argument('--savepairlist', type=str,
+                       help='write the pairs found under -zx/-ox to this file for later runs with -p')
+
+    parser.add_argument('-t', '--iouthreshold', type=float, default=0.1,
+                       help='an IoU threshold ([0,1]) for mapping (default=0.1)')
+
+    parser.add_argument('--sweep', type=float, nargs='+',
+                       help='map every page once for several IoU thresholds, writing the output of each threshold to <savepath>/iou_<threshold> (overrides -t)')
+
+    parser.add_argument('-g', '--granularity', type=str, default='line', choices=['line', 'word'],
+                       help='assign OCR textlines (line) or single words (word) to zones to build the zone texts (default=line)')
+
+    parser.add_argument('-s', '--savepath', type=str, required=True,
+                       help='a path to the root directory of save files')
+
+    parser.add_argument('-f', '--format', type=str, default='json', choices=['json', 'ndjson', 'parquet'],
+                       help='output format: one JSON file per page, pages appended to NDJSON shards, or one parquet row per matched OCR block (default=json)')
+
+    parser.add_argument('--shardsize', type=int, default=256,
+                       help='maximum size of an NDJSON shard in MB (default=256)')
+
+    parser.add_argument('--compress', type=str, default='none', choices=['none', 'gzip', 'zstd'],
+                       help='compression of NDJSON shards (default=none)')
+
+    parser.add_argument('--filepages', type=int, default=1000,
+                       help='number of pages per parquet file; the manifest is committed whenever a file is complete (default=1000)')
+
+    parser.add_argument('-c', '--cachedir', type=str,
+                       help='a directory caching parsed OCR xml files, so later runs skip the XML parsing (default=no cache)')
+
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                       help='number of worker processes (default=1, i.e., no process pool)')
+
+    parser.add_argument('--chunksize', type=int, default=8,
+                       help='number of page pairs handed to a worker at once (default=8)')
+
+    parser.add_argument('--unordered',
+                        help='write results as soon as any worker finishes instead of in input order',
+                        action='store_true')
+
+    parser.add_argument('--force',
+                        help='remap every pair, even those recorded as done in the manifest',
+                        action='store_true')
+
+    parser.add_argument('--profile',
+                        help='time the stages of every page and print a p50/p95/max summary at the end',
+                        action='store_true')
 
-    """
-    Zone Processing
-    """
-    # Read Zone xml
-    xmldoc = minidom.parse(zone_xml_file_path)
+    parser.add_argument('--trace', type=str,
+                        help='append per-page stage timings as JSON lines to this file (implies --profile)')
 
-    # Get image dimension and resize factor
-    img_w  = int(xmldoc.getElementsByTagName('Page')[0].attributes['WIDTH'].value)
-    img_h  = int(xmldoc.getElementsByTagName('Page')[0].attributes['HEIGHT'].value)
+    parser.add_argument('-v', '--verbose',
+                        help='increase output verbosity',
+                        action='store_false')
+
+    args = parser.parse_args()
+    if(args.pairlist is None and (args.zonexmlpath is None or args.ocrxmlpath is None)):
+        parser.error("either -p/--pairlist or both -zx/--zonexmlpath and -ox/--ocrxmlpath are required")
 
-    # Count number of text-blocks
-    zone_textBlocks = xmldoc.getElementsByTagName('TextBlock')
 
-    if DEBUG:
-        print("Zone XML:")
-        print("{} \tWidth (factored)".format(img_w)) 
-        print("{} \tHeight (factored)".format(img_h))
-        print("{} \tTextBlock(s)".format(len(zone_textBlocks)))
 
     """
-    OCR Processing
+    PARAMS
     """
-    # Read OCR xml
-    xmldoc = minidom.parse(ocr_xml_file_path)
+    ZONE_XML_PATH = args.zonexmlpath
+    OCR_XML_PATH  = args.ocrxmlpath
+    SAVE_PATH     = args.savepath
+    IOU_THRESHOLD = args.iouthreshold if args.sweep is None else sorted(set(args.sweep))
+    WORKERS       = args.workers
+    CACHE_DIR     = args.cachedir
+    PROFILE       = args.profile or args.trace is not None
+    DEBUG         = args.verbose
 
-    # Get image dimension and resize factor
-    image_width  = int(xmldoc.getElementsByTagName('Page')[0].attributes['WIDTH'].value)
-    image_height = int(xmldoc.getElementsByTagName('Page')[0].attributes['HEIGHT'].value)
+    if DEBUG:
+        print("ZONE_XML_PATH\t: {}".format(ZONE_XML_PATH))
+        print("OCR_XML_PATH\t: {}".format(OCR_XML_PATH))
+        print("SAVE_PATH\t: {}".format(SAVE_PATH))
 
-    _processingStepSettings = str(xmldoc.getElementsByTagName('processingStepSettings')[0].childNodes[0].nodeValue)
-    _attributes = _processingStepSettings.split('\n')
-            
-    factor = img_w/image_width
 
-    # Count number of text-blocks
-    ocr_textBlocks = xmldoc.getElementsByTagName('TextBlock')
 
-    if DEBUG:
-        print("OCR XML:")
-        print("{} \tWidth (original)".format(image_width)) 
-        print("{} \tHeight (original)".format(image_height))
-        print("{} \tWidth (factored)".format(img_w)) 
-        print("{} \tHeight (factored)".format(img_h))
-        print("{} \tTextBlock(s)".format(len(ocr_textBlocks)))
+    """
+    Prepare Dirs
+    """
+    try:
+        os.makedirs(SAVE_PATH)
+    except FileExistsError:
+        # directory already exist
+        pass
 
 
 
     """
-    MAPPING
+    MAIN
     """
-    # output json
-    map_json = []
-
-    for zone_idx,zone_textBlock in enumerate(zone_textBlocks):
-        # zone coordinates
-        zone_width  = int(float(zone_textBlock.attributes["WIDTH"].value))
-        zone_height = int(float(zone_textBlock.attributes["HEIGHT"].value))
-        zone_vpos   = int(float(zone_textBlock.attributes["VPOS"].value))
-        zone_hpos   = int(float(zone_textBlock.attributes["HPOS"].value))
-
-        zone_p1 = (zone_hpos,zone_vpos)
-        zone_p2 = ((zone_hpos+zone_width),zone_vpos)
-        zone_p3 = (zone_hpos,(zone_vpos+zone_height))
-        zone_p4 = ((zone_hpos+zone_width),(zone_vpos+zone_height))
-
-        zone_coord = [zone_p3, zone_p4, zone_p2, zone_p1]
-
-        # Build json
-        _textBlock_xml = {}
-        _textBlock_xml["zone_coord"] = [list(zone_p3), list(zone_p4), list(zone_p2), list(zone_p1)]
-        _set_ocr_textBlocks = []
-        _set_ocr_contents   = []
-
-        _sub_ocr_contents   = []
-
-        for ocr_idx,ocr_textBlock in enumerate(ocr_textBlocks):
-            # OCR coordinates
-            ocr_width  = int(float(ocr_textBlock.attributes["WIDTH"].value))
-            ocr_height = int(float(ocr_textBlock.attributes["HEIGHT"].value))
-            ocr_vpos   = int(float(ocr_textBlock.attributes["VPOS"].value))
-            ocr_hpos   = int(float(ocr_textBlock.attributes["HPOS"].value))
-
-            width  = int(ocr_width*factor)
-            height = int(ocr_height*factor)
-            vpos   = int(ocr_vpos*factor)
-            hpos   = int(ocr_hpos*factor)
-
-            ocr_p1 = (hpos,vpos)
-            ocr_p2 = ((hpos+width),vpos)
-            ocr_p3 = (hpos,(vpos+height))
-            ocr_p4 = ((hpos+width),(vpos+height))
-
-            ocr_coord = [ocr_p3, ocr_p4, ocr_p2, ocr_p1]
-
-            # Find matching regions
-            zone_polygon = Polygon(zone_coord)
-            ocr_polygon  = Polygon(ocr_coord)
-
-            iou = zone_polygon.intersection(ocr_polygon).area / zone_polygon.union(ocr_polygon).area
-
-            if(iou >= IOU_THRESHOLD):
-                # Set of OCR touching the Zone
-                set_contents = ''
-                sub_contents = ''
-                ocr_textLines = ocr_textBlock.getElementsByTagName('TextLine')
-
-                for ocr_textline in ocr_textLines:
-                    # Textline coordinates
-                    txt_width  = int(float(ocr_textline.attributes["WIDTH"].value))
-                    txt_height = int(float(ocr_textline.attributes["HEIGHT"].value))
-                    txt_vpos   = int(float(ocr_textline.attributes["VPOS"].value))
-                    txt_hpos   = int(float(ocr_textline.attributes["HPOS"].value))
-
-                    width  = int(txt_width*factor)
-                    height = int(txt_height*factor)
-                    vpos   = int(txt_vpos*factor)
-                    hpos   = int(txt_hpos*factor)
-
-                    txt_p1 = (hpos,vpos)
-                    txt_p2 = ((hpos+width),vpos)
-                    txt_p3 = (hpos,(vpos+height))
-                    txt_p4 = ((hpos+width),(vpos+height))
-
-                    txt_coord  = [txt_p3, txt_p4, txt_p2, txt_p1]
-
-                    txt_polygon = Polygon(txt_coord)
-
-                    # Textline string
-                    strings = ocr_textline.getElementsByTagName('String')
-                    for string in strings:
-                        set_contents += (str(string.attributes["CONTENT"].value) + ' ')
-
-                        # Subset of OCR within the Zone
-                        if(zone_polygon.intersects(txt_polygon)):
-                            sub_contents += (str(string.attributes["CONTENT"].value) + ' ')
-
-                # Build json
-                _sub_ocr_contents.append(sub_contents)
-                _set_ocr_textBlocks.append([list(ocr_p3), list(ocr_p4), list(ocr_p2), list(ocr_p1)])
-                _set_ocr_contents.append(set_contents)
-
-        # Build json
-        _textBlock_xml["zone_texts"] = _sub_ocr_contents
-        _textBlock_xml["ocr_coords"] = _set_ocr_textBlocks
-        _textBlock_xml["ocr_texts"]  = _set_ocr_contents
-        map_json.append(_textBlock_xml)
-
-    # Save json
-    data = json.dumps(map_json)
-    out_json_filename = os.path.basename(ocr_xml_file_path).split('.')[0] + '.json'
-    with open(os.path.join(SAVE_PATH,out_json_filename),'w') as out_json_fp:
-        json.dump(map_json, out_json_fp) 
-
-
-print("Done.")
+    # Preparation: pair zone and OCR xml files by basename
+    if(args.pairlist is not None):
+        pairs = read_pair_list(args.pairlist)
+    else:
+        pairs, zone_orphans, ocr_orphans = pair_xml_files(ZONE_XML_PATH, OCR_XML_PATH)
+        orphans_log_path = os.path.join(SAVE_PATH, 'orphans.log')
+        if os.path.exists(orphans_log_path):
+            os.remove(orphans_log_path)
+        if(zone_orphans or ocr_orphans):
+            with open(orphans_log_path, 'w') as orphans_fp:
+                for zone_xml_file_path in zone_orphans:
+                    orphans_fp.write("zone\t{}\n".format(zone_xml_file_path))
+                for ocr_xml_file_path in ocr_orphans:
+                    orphans_fp.write("ocr\t{}\n".format(ocr_xml_file_path))
+            print("{} zone xml(s) and {} OCR xml(s) have no counterpart, see {}".format(len(zone_orphans), len(ocr_orphans), orphans_log_path))
+        if(args.savepairlist is not None):
+            write_pair_list(args.savepairlist, pairs)
+
+    # Skip pairs already mapped with unchanged inputs and parameters
+    # Parquet rows are only durable once their file is complete, so only commit the manifest then
+    manifest = Manifest(SAVE_PATH, commit_every=None if args.format == 'parquet' else 256)
+    params   = {'iou_threshold': IOU_THRESHOLD, 'format': args.format}
+    if(args.granularity != 'line'):
+        params['granularity'] = args.granularity
+
+    tasks        = []
+    fingerprints = {}
+    num_skipped  = 0
+    for idx, (zone_xml_file_path, ocr_xml_file_path) in enumerate(pairs):
+        try:
+            fingerprint = Manifest.fingerprint(zone_xml_file_path, ocr_xml_file_path)
+        except OSError:
+            fingerprint = None
+        if(fingerprint is not None and not args.force and
+           manifest.is_done(zone_xml_file_path, ocr_xml_file_path, params, fingerprint)):
+            num_skipped += 1
+            continue
+        fingerprints[idx] = fingerprint
+        tasks.append((idx, zone_xml_file_path, ocr_xml_file_path))
+
+    if(num_skipped > 0):
+        print("{} page(s) are unchanged since the last run and skipped.".format(num_skipped))
+
+    # Output writer (the parquet output keeps the IoU of each match)
+    WITH_IOU = (args.format == 'parquet')
+    def open_writer(save_path):
+        if(args.format == 'ndjson'):
+            return make_writer('ndjson', save_path,
+                               max_shard_bytes=args.shardsize*1024*1024,
+                               compression=None if args.compress == 'none' else args.compress)
+        if(args.format == 'parquet'):
+            return make_writer('parquet', save_path, max_file_pages=args.filepages)
+        return make_writer(args.format, save_path)
+
+    # A sweep writes each threshold to its own sub-directory
+    if(args.sweep is None):
+        writers = {None: open_writer(SAVE_PATH)}
+    else:
+        writers = {}
+        for iou_threshold in IOU_THRESHOLD:
+            threshold_path = os.path.join(SAVE_PATH, 'iou_{}'.format(iou_threshold))
+            os.makedirs(threshold_path, exist_ok=True)
+            writers[iou_threshold] = open_writer(threshold_path)
+
+    # Returns the output path of every writer, so a lost threshold output is remapped
+    def write_result(ocr_xml_file_path, map_json):
+        if(args.sweep is None):
+            return [writers[None].write(page_key(ocr_xml_file_path), map_json)]
+        return [writer.write(page_key(ocr_xml_file_path), map_json[iou_threshold])
+                for iou_threshold, writer in writers.items()]
+
+    def record_done(idx, zone_xml_file_path, ocr_xml_file_path, out_json_paths):
+        if(fingerprints[idx] is not None):
+            manifest.record(zone_xml_file_path, ocr_xml_file_path, params, out_json_paths, fingerprints[idx])
+        # Sweep writers see the same pages, so their parquet files are completed together
+        if(args.format == 'parquet' and all([writer.checkpoint() for writer in writers.values()])):
+            manifest.commit()
+
+    # Failed pages are recorded instead of aborting the run
+    failed_log_path = os.path.join(SAVE_PATH, 'failed_pages.log')
+    if os.path.exists(failed_log_path):
+        os.remove(failed_log_path)
+    num_failed = 0
+
+    def record_failure(zone_xml_file_path, ocr_xml_file_path, error):
+        with open(failed_log_path, 'a') as failed_fp:
+            failed_fp.write("{}\t{}\n{}\n".format(zone_xml_file_path, ocr_xml_file_path, error))
+
+    # Per-page stage timings (disabled unless --profile/--trace)
+    report = TimingReport(args.trace) if PROFILE else None
+
+    if(WORKERS <= 1):
+        for task_idx, (idx, zone_xml_file_path, ocr_xml_file_path) in enumerate(tqdm(tasks)):
+            print("[{}/{}] Processing \nzone xml: {}\nOCR xml: {}".format(task_idx+1,len(tasks),zone_xml_file_path,ocr_xml_file_path))
+            timer = StageTimer() if PROFILE else None
+            try:
+                map_json = process_pair(zone_xml_file_path, ocr_xml_file_path, IOU_THRESHOLD, DEBUG, WITH_IOU, CACHE_DIR, timer, args.granularity)
+                with stage(timer, 'serialize'):
+                    out_json_paths = write_result(ocr_xml_file_path, map_json)
+                record_done(idx, zone_xml_file_path, ocr_xml_file_path, out_json_paths)
+                if(PROFILE):
+                    report.add(page_key(ocr_xml_file_path), timer.timings)
+            except Exception:
+                num_failed += 1
+                record_failure(zone_xml_file_path, ocr_xml_file_path, traceback.format_exc())
+    else:
+        pages_per_worker = Counter()
+        with tqdm(total=len(tasks)) as pbar:
+            task_fn = partial(_map_task, iou_threshold=IOU_THRESHOLD, with_iou=WITH_IOU, cache_dir=CACHE_DIR, profile=PROFILE, granularity=args.granularity)
+
+            for idx, zone_xml_file_path, ocr_xml_file_path, map_json, error, pid, timings in imap_pages(task_fn, tasks, WORKERS, args.chunksize, not args.unordered):
+                if(error is None):
+                    timer = StageTimer() if PROFILE else None
+                    try:
+                        with stage(timer, 'serialize'):
+                            out_json_paths = write_result(ocr_xml_file_path, map_json)
+                        record_done(idx, zone_xml_file_path, ocr_xml_file_path, out_json_paths)
+                        if(PROFILE):
+                            timer.timings.update(timings)
+                            report.add(page_key(ocr_xml_file_path), timer.timings)
+                    except Exception:
+                        error = traceback.format_exc()
+                if(error is not None):
+                    num_failed += 1
+                    record_failure(zone_xml_file_path, ocr_xml_file_path, error)
+
+                # Aggregate per-worker progress into a single bar
+                if(pid is not None):
+                    pages_per_worker[pid] += 1
+                pbar.set_postfix(workers=len(pages_per_worker), failed=num_failed, refresh=False)
+                pbar.update(1)
+
+    for writer in writers.values():
+        writer.close()
+    manifest.close()
+
+    if(num_failed > 0):
+        print("{} page(s) failed, see {}".format(num_failed, failed_log_path))
+
+    if(PROFILE):
+        report.close()
+        print("\n".join(report.summary()))
+
+    print("Done.")